@@ -1,13 +1,37 @@
 import os
+import sys
 import json
+import argparse
 import re
+import logging
 import time
 import zipfile
 import shutil
+import queue
+import gc
+import random
+import multiprocessing
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Per-file chatter goes through this logger; VMR_LOG_LEVEL=DEBUG brings back the panel details
+logger = logging.getLogger("vmr_migration")
+logger.setLevel(os.getenv("VMR_LOG_LEVEL", "INFO").upper())
+if not logger.handlers:
+    _log_handler = logging.StreamHandler(sys.stdout)
+    _log_handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_log_handler)
+    logger.propagate = False
+
 # Load environment variables from .env file (in parent directory)
 # Load environment variables
 # 1. Try .env in current directory (Docker/Standard)
@@ -27,30 +51,211 @@ CONFIG_FILE = "config.json"
 OUTPUT_DIR = "Group or Department_old"
 METADATA_DIR = os.path.join(OUTPUT_DIR, "_metadata")
 ZIP_OUTPUT = "vmr_migration.zip"
+AUTH_STATE = "vmr_auth.json"  # saved Playwright session, reused to skip the login form
+RESULTS_LOG = os.path.join(OUTPUT_DIR, "results.jsonl")
 
 # Retry Configuration
 MAX_RETRIES = 3
-RETRY_DELAY = 3000  # ms - increased
+RETRY_DELAY = 3000  # ms - increased; base of the exponential backoff
+MAX_RETRY_DELAY = 15000  # ms - backoff ceiling before jitter
 NAVIGATION_TIMEOUT = 30000  # ms - increased
 GRID_LOAD_TIMEOUT = 20000  # ms - increased
 FILE_WAIT_TIMEOUT = 5000  # ms - new: wait for files to appear
 
+# Parallelism: top-level subfolders are split across worker processes (1 = serial)
+# RESUME=1 keeps results.jsonl and skips files it already lists as downloaded
+RESUME = os.getenv("RESUME") == "1"
+# Files-only runs (--no-metadata) skip the info panel entirely; the flag is passed
+# to pool workers through the environment
+SKIP_METADATA = os.getenv("VMR_NO_METADATA") == "1"
+# Opt-in: VMR keeps one folder view per session, so each worker logs in on its own
+# (see README for the concurrent-session caveat)
+PW_WORKERS = int(os.getenv("PW_WORKERS", "1"))
+# Resource types the grid never needs; stylesheets stay on since visibility checks depend on them
+BLOCKED_RESOURCE_TYPES = frozenset(
+    t.strip() for t in os.getenv("BLOCKED_RESOURCE_TYPES", "image,font,media").split(",") if t.strip()
+)
+# File extensions per resource type, used to route only the blocked types' URLs
+_ASSET_EXTENSIONS = {
+    "image": "png|jpe?g|gif|svg|ico|webp|bmp",
+    "font": "woff2?|ttf|otf|eot",
+    "media": "mp4|webm|mp3|wav|ogg",
+    "stylesheet": "css",
+    "script": "m?js",
+}
+# Only URLs that look like a blocked asset are routed, so XHR, document and (by
+# default) stylesheet requests never detour through Python; the handler still
+# confirms the resource type. A blocked type without known extensions routes everything.
+if BLOCKED_RESOURCE_TYPES <= _ASSET_EXTENSIONS.keys():
+    ASSET_URL_RE = re.compile(
+        r"\.(?:%s)(?:[?#]|$)" % "|".join(_ASSET_EXTENSIONS[t] for t in sorted(BLOCKED_RESOURCE_TYPES)),
+        re.IGNORECASE
+    )
+else:
+    ASSET_URL_RE = re.compile(r".")
+
+# Chromium flags for long headless runs: no GPU or /dev/shm, no background
+# throttling or extra services, and no image decoding
+CHROMIUM_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-background-networking",
+    "--disable-renderer-backgrounding",
+    "--disable-features=Translate,BackForwardCache,AcceptCHFrame",
+    "--blink-settings=imagesEnabled=false",
+]
+
+# Playwright keeps per-request objects until their context closes, so the walk
+# moves to a fresh context after this many folders (0 disables)
+CONTEXT_RECYCLE_EVERY = int(os.getenv("CONTEXT_RECYCLE_EVERY", 200))
+
+# Young-generation GC threshold during the walk (default 700); full collections run
+# between top-level folders instead
+GC_THRESHOLD = (7000, 10, 10)
+
+# Navigation entries the grid lists alongside real files
+SKIP_NAMES = frozenset({"My Records", "My Activity", "Group or Department"})
+
+# Folder Call Cache: raw SPA onclick per folder path, so revisits skip the locator search
+FOLDER_CALL_CACHE_SIZE = 2048
+FOLDER_CALLS = OrderedDict()
+# Folder path each page is currently showing, so recovery can skip or shorten re-walks
+PAGE_PATHS = {}
+
 # -----------------------------
 # SETUP
 # -----------------------------
+def json_dumps(obj):
+    """Compact UTF-8 JSON text; orjson when installed, stdlib json otherwise."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+def json_loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
 def load_config():
-    if os.path.exists(CONFIG_FILE):
+    try:
         with open(CONFIG_FILE, "r") as f:
-            return json.load(f)
+            return json_loads(f.read())
+    except FileNotFoundError:
+        pass
     return {
         "base_url": "https://vmrdev.com/vmr/main.do#"
     }
 
 CONFIG = load_config()
 
-# Create output directories
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-os.makedirs(METADATA_DIR, exist_ok=True)
+# Directories already created this run, so repeat visits skip the mkdir syscalls
+_DIRS_MADE = set()
+
+def ensure_dir(path):
+    """Create a directory once per run; later calls are a set lookup."""
+    if path not in _DIRS_MADE:
+        os.makedirs(path, exist_ok=True)
+        # makedirs created the parents too
+        while path and path not in _DIRS_MADE:
+            _DIRS_MADE.add(path)
+            path = os.path.dirname(path)
+
+def _iter_files(root):
+    """Yield every file path under root; scandir's d_type avoids a stat per entry."""
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        yield entry.path
+        except FileNotFoundError:
+            continue
+
+# Create output directory (metadata directory is created on first write)
+ensure_dir(OUTPUT_DIR)
+
+# Per-file page helpers, installed once per document with add_init_script so V8
+# compiles them once and each evaluate only sends a one-line call
+PAGE_HELPERS_JS = """
+window.__vmr = {
+    // Untick every selected row (click() so the SPA keeps its toolbar state in sync)
+    clearSelection() {
+        document.querySelectorAll("tr input[type='checkbox']")
+            .forEach(box => { if (box.checked) box.click(); });
+    },
+    // Click a file's info button: exact name first, then substring; the anchor
+    // sits in the row's li or tr
+    openInfoPanel(name) {
+        const spans = Array.from(document.querySelectorAll('span.mail-sender'));
+        const span = spans.find(s => s.innerText.trim() === name)
+            || spans.find(s => s.innerText.includes(name));
+        if (!span) return 'no-file';
+        const row = span.closest("li.pdli") || span.closest('li') || span.closest('tr');
+        const anchor = row && row.querySelector("a[onclick*='showRecordIndexingView']");
+        if (!anchor) return 'no-info';
+        anchor.click();
+        return 'clicked';
+    },
+    // Read every filled-in panel field, then close the panel; buttons and blanks stay here
+    readAndClosePanel() {
+        const skip = new Set(['', 'property_save', 'property_cancel']);
+        const fields = [];
+        document.querySelectorAll('#indexingDiv2 input, #indexingDiv2 select').forEach(el => {
+            if (skip.has(el.id) || !el.value) return;
+            fields.push({
+                id: el.id,
+                tag: el.tagName,
+                value: el.value,
+                selectedText: el.tagName === 'SELECT' ? (el.options[el.selectedIndex]?.text || '') : ''
+            });
+        });
+        const cancel = document.querySelector('#property_cancel');
+        if (cancel && cancel.offsetParent !== null) {
+            cancel.click();
+        } else if (typeof handleRightContainerAction === 'function') {
+            handleRightContainerAction(true, false);
+        }
+        return fields;
+    },
+    // Clear any leftover selection and tick one file's row: exact name, then the
+    // first 20 characters case-insensitively
+    tickRow(name) {
+        this.clearSelection();
+        const rows = Array.from(document.querySelectorAll('tr'));
+        const prefix = name.slice(0, 20).toLowerCase();
+        const row = rows.find(r => r.innerText.includes(name))
+            || rows.find(r => r.innerText.toLowerCase().includes(prefix));
+        if (!row) return 'no-row';
+        const box = row.querySelector("input[type='checkbox']");
+        if (!box) return 'no-box';
+        if (!box.checked) box.click();
+        return 'ticked';
+    },
+    // Click OK in the download confirmation modal if it is showing
+    confirmModal() {
+        const ok = Array.from(document.querySelectorAll(
+            "button[data-bb-handler='confirm'], button.btn-primary"
+        )).find(b => b.offsetParent !== null
+            && (b.dataset.bbHandler === 'confirm' || b.innerText.trim() === 'OK'));
+        if (ok) ok.click();
+        return !!ok;
+    }
+};
+"""
+
+def _probe(page_obj, selectors):
+    """Check several selectors for existence in a single round-trip.
+    
+    Selectors are CSS; a 'text=' prefix matches a link or button by its exact text.
+    """
+    return page_obj.evaluate("""(sels) => sels.map(s => {
+        if (s.startsWith('text=')) {
+            const text = s.slice(5);
+            return Array.from(document.querySelectorAll('a, button')).some(el => el.innerText.trim() === text);
+        }
+        return !!document.querySelector(s);
+    })""", selectors)
 
 # -----------------------------
 # AUTHENTICATION
@@ -65,316 +270,421 @@ def handle_session_conflict(page_obj):
             print("  [Session Conflict] Clearing conflict...")
             login_here_btn.first.click()
             page_obj.wait_for_load_state("networkidle", timeout=15000)
-            page_obj.wait_for_timeout(3000)
             return True
     except:
         pass
     return False
 
+def register_session_conflict_handler(page_obj):
+    """Clears 'Login Here' popups whenever one blocks an action, instead of polling for it."""
+    def clear_conflict(login_here_btn):
+        print("  [Session Conflict] Clearing conflict...")
+        login_here_btn.first.click()
+        page_obj.wait_for_load_state("networkidle", timeout=15000)
+    
+    page_obj.add_locator_handler(
+        page_obj.locator("text='Login Here'").or_(page_obj.locator("a:has-text('Login Here')")),
+        clear_conflict
+    )
+
+class LoginRejected(Exception):
+    """VMR rejected the credentials; retrying cannot help."""
+
+def _retry(fn, classify=lambda exc: "retry", retries=MAX_RETRIES):
+    """Call fn(attempt) until it succeeds, with exponential backoff and jitter.
+    
+    classify(exc) returns "retry" or "abort"; aborts and the final failure re-raise.
+    """
+    for attempt in range(retries):
+        try:
+            return fn(attempt)
+        except Exception as e:
+            if classify(e) == "abort" or attempt == retries - 1:
+                raise
+            delay = min(RETRY_DELAY * (2 ** attempt), MAX_RETRY_DELAY) + random.randint(0, 1000)
+            print(f"  [Retry] Attempt {attempt + 1} failed: {e} (retrying in {delay} ms)")
+            time.sleep(delay / 1000)
+
 def login_to_vmr(page_obj):
     """Robust login with session conflict handling."""
     login_url = CONFIG.get("base_url")
     print(f"Navigating to login page: {login_url}")
     
-    for attempt in range(MAX_RETRIES):
+    def attempt_login(attempt):
+        page_obj.goto(login_url, wait_until="domcontentloaded", timeout=30000)
+        wait_for_landing(page_obj)
+        
+        # A restored storage_state lands straight on the grid
+        has_grid, has_login_form = _probe(page_obj, ["span.mail-sender", "input[name='corpPassword']"])
+        if has_grid:
+            print("Already logged in (saved session)!")
+            return True
+        
+        if "main.do" in page_obj.url and not has_login_form:
+            print("Already logged in!")
+            return True
+        
+        if not (VMR_CORPORATE_ID and VMR_USERNAME and VMR_PASSWORD):
+            raise LoginRejected("credentials missing from .env")
+        
+        print(f"Attempt {attempt + 1}: Filling credentials...")
+        
+        page_obj.fill("input[name='corpName']", VMR_CORPORATE_ID)
+        page_obj.fill("input[name='corpEmailID']", VMR_USERNAME)
+        page_obj.fill("input[name='corpPassword']", VMR_PASSWORD)
+        
+        submit_btn = page_obj.locator(
+            "button[type='submit'], input[type='submit'], input[type='image'][src*='login']"
+        )
+        if submit_btn.count() > 0:
+            submit_btn.first.click()
+        else:
+            page_obj.press("input[name='corpPassword']", "Enter")
+        
+        wait_for_landing(page_obj, "span.mail-sender", timeout=15000)
+        handle_session_conflict(page_obj)
+        
         try:
-            page_obj.goto(login_url, wait_until="domcontentloaded", timeout=30000)
-            page_obj.wait_for_timeout(2000)
-            
-            if "main.do" in page_obj.url:
-                print("Already logged in!")
-                return True
-            
-            print(f"Attempt {attempt + 1}: Filling credentials...")
-            
-            page_obj.fill("input[name='corpName']", VMR_CORPORATE_ID)
-            page_obj.fill("input[name='corpEmailID']", VMR_USERNAME)
-            page_obj.fill("input[name='corpPassword']", VMR_PASSWORD)
-            
-            submit_btn = page_obj.locator(
-                "button[type='submit'], input[type='submit'], input[type='image'][src*='login']"
-            )
-            if submit_btn.count() > 0:
-                submit_btn.first.click()
-            else:
-                page_obj.press("input[name='corpPassword']", "Enter")
-            
-            page_obj.wait_for_timeout(3000)
-            handle_session_conflict(page_obj)
-            
-            try:
-                page_obj.wait_for_selector("span.mail-sender", timeout=15000)
-                print("✓ Login successful!")
-                return True
-            except:
-                if "main.do" in page_obj.url:
-                    print("✓ Login successful!")
-                    return True
-                
-        except Exception as e:
-            print(f"  Login attempt {attempt + 1} failed: {e}")
-            if attempt < MAX_RETRIES - 1:
-                page_obj.wait_for_timeout(RETRY_DELAY)
-            
-    print("✗ Login failed after all retries")
+            page_obj.wait_for_selector("span.mail-sender", timeout=15000)
+        except PlaywrightTimeout:
+            if "main.do" not in page_obj.url:
+                if page_obj.evaluate("() => /invalid/i.test(document.body.innerText)"):
+                    raise LoginRejected("invalid credentials")
+                raise
+        print("✓ Login successful!")
+        return True
+    
+    try:
+        return _retry(
+            attempt_login,
+            classify=lambda exc: "abort" if isinstance(exc, LoginRejected) else "retry"
+        )
+    except LoginRejected as e:
+        print(f"✗ Login rejected: {e}")
+    except Exception as e:
+        print(f"  Login failed: {e}")
+        print("✗ Login failed after all retries")
     return False
 
+def ensure_logged_in(page_obj):
+    """One probe for grid, login form and conflict popup; re-login only when the session expired."""
+    has_grid, has_login_form, has_conflict = _probe(
+        page_obj, ["span.mail-sender", "input[name='corpPassword']", "text=Login Here"]
+    )
+    if has_grid:
+        return True
+    if has_conflict:
+        return handle_session_conflict(page_obj)
+    if has_login_form:
+        print("  [Session] Session expired, logging in again...")
+        if not login_to_vmr(page_obj):
+            return False
+        # Refresh the saved session so the next run starts logged in; pool workers
+        # keep their own sessions out of the shared file
+        if multiprocessing.parent_process() is None:
+            page_obj.context.storage_state(path=AUTH_STATE)
+        return True
+    return True
+
 # -----------------------------
 # GRID HELPERS
 # -----------------------------
+def wait_ready(page_obj, predicate_js, timeout=10000):
+    """Polls every 100 ms until the document is complete and predicate_js is true."""
+    try:
+        page_obj.wait_for_function(
+            f"() => document.readyState === 'complete' && ({predicate_js})",
+            polling=100, timeout=timeout
+        )
+        return True
+    except PlaywrightTimeout:
+        return False
+
+# True once the grid has rows and the count matched on the previous 100 ms poll.
+# With allowEmpty, a listing that stays at zero rows for EMPTY_GRID_SETTLE_MS after
+# the old (stale) grid is gone, with no login form or conflict popup, counts too.
+EMPTY_GRID_SETTLE_MS = 1500
+_GRID_STABLE_TEMPLATE = """(() => {
+    const n = document.querySelectorAll('span.mail-sender:not([data-vmr-stale])').length;
+    const now = performance.now();
+    if (window.__vmrGridCount !== n) {
+        window.__vmrGridCount = n;
+        window.__vmrGridSince = now;
+        return false;
+    }
+    if (n > 0) return true;
+    if (!%s) return false;
+    // The settle time only starts once the old grid has left the DOM
+    if (document.querySelector('span.mail-sender[data-vmr-stale]')) {
+        window.__vmrGridSince = now;
+        return false;
+    }
+    const loggedOut = !!document.querySelector("input[name='corpPassword']")
+        || Array.from(document.querySelectorAll('a, button')).some(el => el.innerText.trim() === 'Login Here');
+    return !loggedOut && now - window.__vmrGridSince >= %d;
+})()"""
+GRID_STABLE_JS = _GRID_STABLE_TEMPLATE % ("false", EMPTY_GRID_SETTLE_MS)
+FRESH_GRID_STABLE_JS = _GRID_STABLE_TEMPLATE % ("true", EMPTY_GRID_SETTLE_MS)
+
 def wait_for_grid(page_obj, timeout=GRID_LOAD_TIMEOUT):
     """Waits for the VMR grid to load with items."""
+    if wait_ready(page_obj, GRID_STABLE_JS, timeout):
+        return True
+    print("  [Warning] Grid didn't load in time")
+    return False
+
+# Tags the current grid spans so a re-render can be told apart from the old grid
+# (and resets the poll count so the next folder needs two matching polls of its own)
+MARK_GRID_STALE_JS = ("document.querySelectorAll('span.mail-sender').forEach(s => s.dataset.vmrStale = '1');"
+                      " window.__vmrGridCount = -1")
+
+def wait_for_fresh_grid(page_obj, timeout=GRID_LOAD_TIMEOUT):
+    """Waits until the grid re-renders after MARK_GRID_STALE_JS; an empty folder counts as rendered."""
+    # Only unmarked spans count, so the old grid never looks stable
+    if wait_ready(page_obj, FRESH_GRID_STABLE_JS, timeout):
+        return True
+    print("  [Warning] Grid didn't load in time")
+    return False
+
+def wait_for_landing(page_obj, selectors="span.mail-sender, input[name='corpPassword']", timeout=NAVIGATION_TIMEOUT):
+    """Waits until any of selectors, or a 'Login Here' popup, is in the DOM."""
     try:
-        # Wait for grid structure
-        page_obj.wait_for_selector("span.mail-sender", timeout=timeout, state="visible")
-        page_obj.wait_for_timeout(1500)  # Extra wait for dynamic content
-        
-        # Check if grid has content
-        items = page_obj.locator("span.mail-sender").count()
-        if items > 0:
-            return True
-        
-        print("  [Warning] Grid loaded but empty")
-        return False
-    except:
-        print("  [Warning] Grid didn't load in time")
-        return False
+        page_obj.wait_for_function("""(sels) => !!document.querySelector(sels)
+            || Array.from(document.querySelectorAll('a, button')).some(el => el.innerText.trim() === 'Login Here')""",
+            arg=selectors, timeout=timeout)
+    except PlaywrightTimeout:
+        pass
+
+def remember_folder_call(path, onclick):
+    """Caches the SPA call that opens a folder, evicting the least recently used."""
+    key = tuple(path)
+    FOLDER_CALLS[key] = onclick
+    FOLDER_CALLS.move_to_end(key)
+    if len(FOLDER_CALLS) > FOLDER_CALL_CACHE_SIZE:
+        FOLDER_CALLS.popitem(last=False)
 
-def get_grid_items(page_obj):
+def get_grid_items(page_obj, current_path=None):
     """Get all folders and files from current grid view."""
     folders = []
     files = []
     
-    all_spans = page_obj.locator("span.mail-sender").all()
+    # One round-trip classifies the whole grid: [text, folder onclick or null] per item
+    items = page_obj.evaluate("""() => {
+        const skip = new Set(['', '..', 'Up', 'Parent Folder']);
+        const items = [];
+        document.querySelectorAll('span.mail-sender').forEach(s => {
+            const txt = (s.innerText || '').trim();
+            if (skip.has(txt)) return;
+            const onclick = s.parentElement?.getAttribute('onclick') || '';
+            items.push([txt, onclick.includes('getFolderandFileList') ? onclick : null]);
+        });
+        return items;
+    }""")
     
-    for span in all_spans:
-        try:
-            txt = span.inner_text().strip()
-            if not txt or txt in ["..", "Up", "Parent Folder"]:
-                continue
-            
-            parent = span.locator("xpath=..")
-            onclick = parent.get_attribute("onclick") or ""
-            
-            if "getFolderandFileList" in onclick:
-                folders.append(txt)
-            else:
-                files.append(txt)
-        except:
-            continue
+    for txt, onclick in items:
+        if onclick is None:
+            files.append(txt)
+        else:
+            folders.append(txt)
+            if current_path is not None:
+                remember_folder_call(current_path + [txt], onclick)
     
     return folders, files
 
 # -----------------------------
 # NAVIGATION
 # -----------------------------
-def click_folder(page_obj, folder_name):
-    """Clicks a folder in the SPA."""
-    handle_session_conflict(page_obj)
-    
-    folder_locator = page_obj.locator("span.mail-sender").filter(has_text=folder_name)
-    if folder_locator.count() == 0:
-        folder_locator = page_obj.locator(f"span.mail-sender:has-text('{folder_name}')")
-    
-    if folder_locator.count() == 0:
-        raise Exception(f"Folder not found: {folder_name}")
+def click_folder(page_obj, folder_name, path=None):
+    """Clicks a folder in the SPA, replaying its cached onclick call when known."""
+    onclick = FOLDER_CALLS.get(tuple(path)) if path else None
+    if onclick:
+        FOLDER_CALLS.move_to_end(tuple(path))
+        try:
+            page_obj.evaluate(f"() => {{ {MARK_GRID_STALE_JS}; {onclick} }}")
+        except Exception as e:
+            print(f"  [Warning] Cached folder call failed, using locator: {e}")
+            onclick = None
     
-    folder_locator.first.click()
-    page_obj.wait_for_load_state("domcontentloaded")
-    page_obj.wait_for_timeout(2000)  # Increased wait
+    if not onclick:
+        folder_locator = page_obj.locator("span.mail-sender").filter(has_text=folder_name)
+        if folder_locator.count() == 0:
+            folder_locator = page_obj.locator(f"span.mail-sender:has-text('{folder_name}')")
+        
+        if folder_locator.count() == 0:
+            raise Exception(f"Folder not found: {folder_name}")
+        
+        page_obj.evaluate(f"() => {{ {MARK_GRID_STALE_JS} }}")
+        folder_locator.first.click()
     
-    # Wait for grid to update
-    wait_for_grid(page_obj)
+    # Wait for the folder's grid to replace the old one
+    if not wait_for_fresh_grid(page_obj):
+        PAGE_PATHS.pop(page_obj, None)
+        # evaluate() and forced clicks bypass the locator handler, so a 'Login Here'
+        # popup or an expired session mid-walk only shows up as this timeout
+        if not handle_session_conflict(page_obj):
+            ensure_logged_in(page_obj)
+        raise Exception(f"Grid didn't load for folder: {folder_name}")
+    PAGE_PATHS[page_obj] = tuple(path) if path else None
     return True
 
 def navigate_to_path(page_obj, path_list):
     """Navigate to a specific path from root."""
     print(f"  Navigating to: {' > '.join(path_list)}")
     
+    # Already showing a live grid for this folder
+    if PAGE_PATHS.get(page_obj) == tuple(path_list):
+        if _probe(page_obj, ["span.mail-sender:not([data-vmr-stale])"])[0]:
+            print("    Already there")
+            return True
+    
     # Go to root
+    PAGE_PATHS.pop(page_obj, None)
     page_obj.goto(CONFIG.get("base_url"), wait_until="domcontentloaded", timeout=30000)
-    page_obj.wait_for_timeout(2000)
-    handle_session_conflict(page_obj)
+    wait_for_landing(page_obj)
     
-    if not wait_for_grid(page_obj):
+    if not ensure_logged_in(page_obj) or not wait_for_grid(page_obj):
         raise Exception("Failed to load root")
     
+    # Jump straight to the deepest folder whose SPA call is cached, then walk the rest
+    start = 0
+    for idx in range(len(path_list) - 1, -1, -1):
+        if tuple(path_list[:idx + 1]) in FOLDER_CALLS:
+            try:
+                print(f"    Jumping to: {path_list[idx]}")
+                click_folder(page_obj, path_list[idx], path_list[:idx + 1])
+                start = idx + 1
+            except Exception as e:
+                print(f"    [Warning] Jump failed, walking from root: {e}")
+            break
+    
     # Navigate through path
-    for idx, folder_name in enumerate(path_list):
+    for idx in range(start, len(path_list)):
+        folder_name = path_list[idx]
         print(f"    [{idx + 1}/{len(path_list)}] Entering: {folder_name}")
-        click_folder(page_obj, folder_name)
+        # Scan the grid so this hop (and later returns to it) replay the SPA call
+        if tuple(path_list[:idx + 1]) not in FOLDER_CALLS:
+            get_grid_items(page_obj, path_list[:idx])
+        click_folder(page_obj, folder_name, path_list[:idx + 1])
     
-    # Extra wait at destination to ensure files load
-    page_obj.wait_for_timeout(FILE_WAIT_TIMEOUT)
+    # Wait at destination until file rows are attached (bounded by FILE_WAIT_TIMEOUT)
+    try:
+        page_obj.wait_for_selector("tr input[type='checkbox']", state="attached", timeout=FILE_WAIT_TIMEOUT)
+    except PlaywrightTimeout:
+        pass
     return True
 
 # -----------------------------
 # METADATA EXTRACTION
 # -----------------------------
+def wait_for_panel_closed(page_obj, timeout=2000):
+    """Waits for the metadata panel to hide so the next file's panel isn't read stale."""
+    try:
+        page_obj.wait_for_selector("#indexingDiv2", state="hidden", timeout=timeout)
+    except PlaywrightTimeout:
+        pass
+
+def map_metadata_fields(by_id):
+    """Maps panel fields (keyed by element id) to manifest metadata names."""
+    metadata = {}
+    
+    # Classification
+    classification = by_id.get("fileContentType")
+    if classification and classification["value"] and classification["value"] != "select":
+        metadata["Classification"] = classification["selectedText"]
+    
+    # Document Sub Type - first subtype dropdown present with a value
+    dropdown_ids = [
+        "vmr_hrrecruitmentdropdown",
+        "vmr_hrannualreviewdropdown",
+        "vmr_hrcurrentemploymentdropdown",
+        "vmr_hreducationaldropdown",
+        "vmr_hrexitdropdown",
+        "vmr_hrpastemploymentdropdown",
+        "vmr_hrpersonalkycdropdown",
+        "vmr_hrstatutorydropdown",
+        "vmr_hrverificationdropdown"
+    ]
+    for dropdown_id in dropdown_ids:
+        dropdown = by_id.get(dropdown_id)
+        if dropdown and dropdown["value"]:
+            metadata["Document Sub Type"] = dropdown["value"]
+            break
+    
+    # Input field values
+    field_mappings = {
+        "Quick Reference": "vmr_quickref",
+        "Document Date": "vmr_docdate",
+        "Expiry Date": "vmr_expirydate",
+        "Offsite Location": "vmr_geotag",
+        "On-Premises Location": "vmr_offpremise",
+        "Remarks": "vmr_remarks",
+        "Keywords": "vmr_keywords",
+        "Document Type": "vmr_doctype",
+        "Document SubType Internal": "vmr_docsubtype"
+    }
+    for field_name, field_id in field_mappings.items():
+        field = by_id.get(field_id)
+        if field and field["value"] and field["value"].strip():
+            metadata[field_name] = field["value"].strip()
+    
+    # Lifespan
+    lifespan = by_id.get("vmr_doclifespan")
+    if lifespan and lifespan["value"] and lifespan["value"] != "0":
+        metadata["Lifespan"] = lifespan["value"]
+    
+    # Category
+    category = by_id.get("vmr_category")
+    if category and category["value"]:
+        metadata["Category"] = category["selectedText"]
+    
+    return metadata
+
 def extract_file_metadata(page_obj, filename):
     """Extract metadata from file info dialog by finding the file in the grid."""
     metadata = {}
+    if SKIP_METADATA:
+        return metadata
     
     try:
-        print(f"      Extracting metadata...")
+        logger.debug("      Extracting metadata...")
         
-        # Find the file by filename in the grid
-        file_span = page_obj.locator("span.mail-sender").filter(has_text=filename)
+        # Find the file's row and click its info button in one round-trip
+        found = page_obj.evaluate("(name) => window.__vmr.openInfoPanel(name)", filename)
         
-        if file_span.count() == 0:
-            print(f"      [Warning] Could not locate file in grid: {filename}")
+        if found == "no-file":
+            logger.warning("      [Warning] Could not locate file in grid: %s", filename)
             return metadata
-        
-        # Try multiple strategies to find the parent container with the info button
-        info_anchor = None
-        
-        # Strategy 1: Look for parent li with class 'pdli '
-        parent_li = file_span.first.locator("xpath=ancestor::li[@class='pdli ']")
-        if parent_li.count() > 0:
-            info_anchor = parent_li.locator("a[onclick*='showRecordIndexingView']")
-        
-        # Strategy 2: Look for parent li without specific class
-        if not info_anchor or info_anchor.count() == 0:
-            parent_li = file_span.first.locator("xpath=ancestor::li")
-            if parent_li.count() > 0:
-                info_anchor = parent_li.first.locator("a[onclick*='showRecordIndexingView']")
-        
-        # Strategy 3: Look in parent tr (table row)
-        if not info_anchor or info_anchor.count() == 0:
-            parent_tr = file_span.first.locator("xpath=ancestor::tr")
-            if parent_tr.count() > 0:
-                info_anchor = parent_tr.first.locator("a[onclick*='showRecordIndexingView']")
-        
-        # Strategy 4: Search nearby in the DOM
-        if not info_anchor or info_anchor.count() == 0:
-            # Look for any info button in the same row/container
-            info_anchor = page_obj.locator("a[onclick*='showRecordIndexingView']").filter(has_text="")
-        
-        if not info_anchor or info_anchor.count() == 0:
-            print(f"      [Warning] Info button not found for file")
+        if found == "no-info":
+            logger.warning("      [Warning] Info button not found for file")
             return metadata
         
-        # Click the first matching info button
-        print(f"      [DEBUG] Clicking info button...")
-        info_anchor.first.click()
-        page_obj.wait_for_timeout(3000)
-        
         # Wait for the metadata panel to appear
-        panel = page_obj.locator("#indexingDiv2")
-        if panel.count() == 0 or not panel.is_visible():
-            print(f"      [Warning] Metadata panel did not appear")
-            return metadata
-        
-        print(f"      Metadata panel opened successfully")
-        
-        # Extract Classification
-        try:
-            selected_option = page_obj.locator("#fileContentType option[selected]")
-            if selected_option.count() == 0:
-                # Try to get the currently selected value
-                selected_value = page_obj.locator("#fileContentType").evaluate("el => el.value")
-                if selected_value and selected_value != "select":
-                    selected_text = page_obj.locator(f"#fileContentType option[value='{selected_value}']").inner_text()
-                    metadata["Classification"] = selected_text
-            else:
-                classification = selected_option.inner_text()
-                if classification != "Select":
-                    metadata["Classification"] = classification
-        except Exception as e:
-            print(f"      [Debug] Classification extraction failed: {e}")
-        
-        # Extract Document Sub Type - try multiple dropdown IDs
         try:
-            dropdown_ids = [
-                "#vmr_hrrecruitmentdropdown",
-                "#vmr_hrannualreviewdropdown", 
-                "#vmr_hrcurrentemploymentdropdown",
-                "#vmr_hreducationaldropdown",
-                "#vmr_hrexitdropdown",
-                "#vmr_hrpastemploymentdropdown",
-                "#vmr_hrpersonalkycdropdown",
-                "#vmr_hrstatutorydropdown",
-                "#vmr_hrverificationdropdown"
-            ]
-            
-            for dropdown_id in dropdown_ids:
-                if page_obj.locator(dropdown_id).count() > 0:
-                    selected_val = page_obj.locator(dropdown_id).evaluate("el => el.value")
-                    if selected_val:
-                        metadata["Document Sub Type"] = selected_val
-                        break
-        except Exception as e:
-            print(f"      [Debug] Document Sub Type extraction failed: {e}")
-        
-        # Extract input field values
-        field_mappings = {
-            "Quick Reference": "#vmr_quickref",
-            "Document Date": "#vmr_docdate",
-            "Expiry Date": "#vmr_expirydate",
-            "Offsite Location": "#vmr_geotag",
-            "On-Premises Location": "#vmr_offpremise",
-            "Remarks": "#vmr_remarks",
-            "Keywords": "#vmr_keywords",
-            "Document Type": "#vmr_doctype",
-            "Document SubType Internal": "#vmr_docsubtype"
-        }
+            page_obj.wait_for_selector("#indexingDiv2", state="visible", timeout=5000)
+        except PlaywrightTimeout:
+            logger.warning("      [Warning] Metadata panel did not appear")
+            return metadata
         
-        for field_name, selector in field_mappings.items():
-            try:
-                if page_obj.locator(selector).count() > 0:
-                    value = page_obj.locator(selector).input_value()
-                    if value and value.strip():
-                        metadata[field_name] = value.strip()
-            except Exception as e:
-                print(f"      [Debug] {field_name} extraction failed: {e}")
+        logger.debug("      Metadata panel opened successfully")
         
-        # Extract Lifespan
-        try:
-            if page_obj.locator("#vmr_doclifespan").count() > 0:
-                lifespan_value = page_obj.locator("#vmr_doclifespan").evaluate("el => el.value")
-                if lifespan_value and lifespan_value != "0":
-                    metadata["Lifespan"] = lifespan_value
-        except Exception as e:
-            print(f"      [Debug] Lifespan extraction failed: {e}")
+        # Read every filled-in panel field and close the panel in one round-trip
+        fields = page_obj.evaluate("() => window.__vmr.readAndClosePanel()")
+        by_id = {field["id"]: field for field in fields}
         
-        # Extract Category
-        try:
-            if page_obj.locator("#vmr_category").count() > 0:
-                category_value = page_obj.locator("#vmr_category").evaluate("el => el.value")
-                if category_value:
-                    # Get the text of the selected option
-                    category_text = page_obj.locator(f"#vmr_category option[value='{category_value}']").inner_text()
-                    metadata["Category"] = category_text
-        except Exception as e:
-            print(f"      [Debug] Category extraction failed: {e}")
+        if by_id:
+            metadata = map_metadata_fields(by_id)
         
-        print(f"      Extracted {len(metadata)} metadata fields")
+        logger.debug("      Extracted %d metadata fields: %s", len(metadata), metadata)
         
-        # DEBUG: Print each field and its type
-        for key, value in metadata.items():
-            print(f"        {key}: {type(value).__name__} = {value}")
-        
-        # Close the metadata panel
-        try:
-            cancel_btn = page_obj.locator("#property_cancel")
-            if cancel_btn.count() > 0 and cancel_btn.is_visible():
-                cancel_btn.click()
-                page_obj.wait_for_timeout(1000)
-                print(f"      Metadata panel closed")
-        except:
-            # Fallback: try JavaScript
-            try:
-                page_obj.evaluate("handleRightContainerAction(true, false)")
-                page_obj.wait_for_timeout(1000)
-            except:
-                pass
+        wait_for_panel_closed(page_obj)
+        logger.debug("      Metadata panel closed")
         
     except Exception as e:
-        print(f"      [Warning] Metadata extraction failed: {e}")
+        logger.warning("      [Warning] Metadata extraction failed: %s", e)
         # Try to close panel
         try:
             page_obj.locator("#property_cancel").click()
-            page_obj.wait_for_timeout(500)
+            wait_for_panel_closed(page_obj)
         except:
             pass
     
@@ -382,272 +692,822 @@ def extract_file_metadata(page_obj, filename):
 # -----------------------------
 # DOWNLOAD FUNCTIONS
 # -----------------------------
+# Lower-cased file names already claimed in each local folder this run
+_dir_cache = {}
+
+_ILLEGAL_CHARS = str.maketrans({c: "_" for c in '\\/*?:"<>|'})
+MAX_PATH_LEN = 240
+
+def sanitize_filename(filename):
+    """Replaces characters Windows/Linux can't store and trims trailing dots/spaces."""
+    name = filename.translate(_ILLEGAL_CHARS).strip().rstrip(". ")
+    return name or f"unnamed_file_{int(time.time())}"
+
+def get_unique_local_path(directory, filename):
+    """Claim a path for filename in directory, suffixing ' (n)' on a case-insensitive clash."""
+    claimed = _dir_cache.setdefault(directory, set())
+    filename = sanitize_filename(filename)
+    base, ext = os.path.splitext(filename)
+    overflow = len(directory) + 1 + len(filename) - MAX_PATH_LEN
+    if overflow > 0 and len(base) > overflow:
+        base = base[:len(base) - overflow].rstrip(". ")
+        filename = base + ext
+    candidate = filename
+    counter = 1
+    while candidate.lower() in claimed:
+        candidate = f"{base} ({counter}){ext}"
+        counter += 1
+    claimed.add(candidate.lower())
+    return os.path.join(directory, candidate)
+
+def _looks_like_zip(path):
+    """Cheap local-file-header check before zipfile's end-of-archive scan."""
+    with open(path, "rb") as f:
+        return f.read(4) == b"PK\x03\x04"
+
+def wait_for_toolbar(page_obj, timeout=5000):
+    """Waits for the bulk-download link to show once a checkbox is ticked."""
+    try:
+        page_obj.wait_for_selector("a#multipleFile_download", state="visible", timeout=timeout)
+    except PlaywrightTimeout:
+        pass
+
+def save_download(download, file_path):
+    """Rename Playwright's temp file into place instead of copying it with save_as."""
+    try:
+        tmp = download.path()
+        try:
+            os.replace(tmp, file_path)
+        except OSError:
+            # Temp dir on another filesystem
+            shutil.move(tmp, file_path)
+    except Exception:
+        download.save_as(file_path)
+
+def confirm_download_modal(page_obj, delays=(100, 200, 400)):
+    """Clicks OK in the download confirmation modal, polling with backoff until it shows."""
+    for delay in delays:
+        page_obj.wait_for_timeout(delay)
+        clicked = page_obj.evaluate("() => window.__vmr.confirmModal()")
+        if clicked:
+            return True
+    return False
+
+def find_download_button(page_obj):
+    """Locate the toolbar download link (or its icon's anchor) with a single probe."""
+    has_link, has_icon = _probe(page_obj, ["a#multipleFile_download", "i.fa-download.mutiplefiledownloadiconclr"])
+    if has_link:
+        return page_obj.locator("a#multipleFile_download")
+    if has_icon:
+        return page_obj.locator("i.fa-download.mutiplefiledownloadiconclr").locator("xpath=ancestor::a")
+    return None
+
+# Metadata is buffered per folder and written as one JSON file per folder by a
+# background thread, so the page never waits on disk
+_meta_queue = queue.Queue()
+_meta_thread = None
+_folder_meta = {}
+
+def _write_metadata_file(metadata_file, metadata):
+    ensure_dir(os.path.dirname(metadata_file))
+    if RESUME:
+        # Keep entries for files an earlier run downloaded into this folder
+        try:
+            with open(metadata_file, "r", encoding="utf-8") as f:
+                metadata = {**json_loads(f.read()), **metadata}
+        except FileNotFoundError:
+            pass
+    with open(metadata_file, "w", encoding="utf-8") as f:
+        f.write(json_dumps(metadata))
+
+def _metadata_writer():
+    while True:
+        item = _meta_queue.get()
+        if item is None:
+            return
+        try:
+            _write_metadata_file(*item)
+        except Exception as e:
+            print(f"      [Warning] Failed to write metadata {item[0]}: {e}")
+
+def start_metadata_writer():
+    """Start the background metadata writer thread."""
+    global _meta_thread
+    _meta_thread = threading.Thread(target=_metadata_writer, daemon=True)
+    _meta_thread.start()
+
+def stop_metadata_writer():
+    """Drain pending metadata writes and stop the writer thread."""
+    global _meta_thread
+    for folder_path in list(_folder_meta):
+        flush_folder_metadata(folder_path)
+    if _meta_thread is not None:
+        _meta_queue.put(None)
+        _meta_thread.join()
+        _meta_thread = None
+
+def save_metadata(metadata, file_path, filename):
+    """Buffers a downloaded file's metadata (file_path relative to the output dir)."""
+    if not metadata:
+        return
+    folder_path, local_name = os.path.split(file_path)
+    _folder_meta.setdefault(folder_path or ".", {})[local_name] = metadata
+
+def flush_folder_metadata(folder_path):
+    """Queues _metadata/<folder>/_metadata.json, keyed by local file name, for a finished folder."""
+    metadata = _folder_meta.pop(folder_path or ".", None)
+    if not metadata:
+        return
+    # Mirror the folder tree under _metadata/: flattening the path into one name lets
+    # HR/A_B and HR_A/B overwrite each other's metadata
+    metadata_file = os.path.join(METADATA_DIR, folder_path or ".", "_metadata.json")
+    if _meta_thread is not None:
+        _meta_queue.put((metadata_file, metadata))
+    else:
+        _write_metadata_file(metadata_file, metadata)
+
+# Archive unpacking runs on a small thread pool so the page can move on to the
+# next folder; finished jobs are recorded from the main thread by drain_io_jobs
+IO_WORKERS = 2
+_io_pool = None
+_io_jobs = []
+
+def submit_io(fn, *args):
+    """Run fn on the file-IO pool; it must return a list of results to record."""
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS)
+    _io_jobs.append(_io_pool.submit(fn, *args))
+
+def drain_io_jobs(manifest_logger, wait=False):
+    """Record the results of finished IO jobs; with wait=True, of all of them."""
+    pending = []
+    for job in _io_jobs:
+        if not (wait or job.done()):
+            pending.append(job)
+            continue
+        try:
+            for result in job.result():
+                record_result(manifest_logger, result)
+        except Exception as e:
+            print(f"  [Warning] Archive unpacking failed: {e}")
+    _io_jobs[:] = pending
+
+def _unpack_archive(archive_path, members, results):
+    """Copy each archive member to its target path; returns the results whose file landed."""
+    landed = set()
+    try:
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            for member_name, target_path in members.items():
+                # Stream to .part and rename, so a failure never leaves a half-written
+                # file and doesn't cost the members that already landed
+                part_path = target_path + ".part"
+                try:
+                    with zip_ref.open(member_name) as src, open(part_path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    os.replace(part_path, target_path)
+                    landed.add(target_path)
+                except Exception as e:
+                    logger.warning("      ✗ Failed to unpack %s: %s", member_name, e)
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+    finally:
+        os.remove(archive_path)
+    return [result for result in results if result["path"] in landed]
+
+def download_files_as_archive(page_obj, files, local_folder, output_base, manifest_logger):
+    """Select every file in the current folder and download them as one archive.
+    
+    Returns the names it took over; results are recorded now for a lone unwrapped
+    file, or by drain_io_jobs once the archive has been unpacked.
+    """
+    print(f"  Batch downloading {len(files)} files...")
+    
+    target_paths = {filename: get_unique_local_path(local_folder, filename) for filename in files}
+    
+    handled = set()
+    handed_off = False
+    archive_path = os.path.join(local_folder, f"_batch_{int(time.time())}.zip")
+    try:
+        # Tick every file checkbox in one round-trip (click() so the SPA enables its toolbar)
+        selected = page_obj.evaluate("""(names) => {
+            let count = 0;
+            document.querySelectorAll('tr').forEach(row => {
+                const span = row.querySelector('span.mail-sender');
+                const box = row.querySelector("input[type='checkbox']");
+                if (span && box && names.includes(span.innerText.trim())) {
+                    if (!box.checked) box.click();
+                    count++;
+                }
+            });
+            return count;
+        }""", files)
+        if selected == 0:
+            print(f"      ✗ No file checkboxes found for batch download")
+            return handled
+        wait_for_toolbar(page_obj)
+        
+        dl_btn = find_download_button(page_obj)
+        if dl_btn is None:
+            print(f"      ✗ Download button not found")
+            return handled
+        
+        with page_obj.expect_download(timeout=300000) as download_info:
+            dl_btn.first.click(force=True)
+            confirm_download_modal(page_obj)
+        
+        # The archive streams in the background while the metadata panels are read;
+        # save_download then waits for whatever is left of the transfer
+        metadata_by_file = {filename: extract_file_metadata(page_obj, filename) for filename in files}
+        save_download(download_info.value, archive_path)
+        
+        # Match members by name from the central directory; a lone file may arrive unwrapped
+        members = {}
+        if _looks_like_zip(archive_path) and zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+                for member in zip_ref.infolist():
+                    member_name = os.path.basename(member.filename)
+                    if not member.is_dir() and member_name in target_paths:
+                        members[member.filename] = target_paths[member_name]
+                        handled.add(member_name)
+        elif len(files) == 1:
+            os.replace(archive_path, target_paths[files[0]])
+            handled.add(files[0])
+        
+        results = []
+        for filename in handled:
+            file_path = target_paths[filename]
+            save_metadata(metadata_by_file[filename], os.path.relpath(file_path, output_base), filename)
+            logger.info("      ✓ Downloaded: %s", filename)
+            results.append({
+                "filename": filename,
+                # Name on disk: sanitised and/or " (n)"-suffixed, so it can differ from filename
+                "local_name": os.path.basename(file_path),
+                "path": file_path,
+                "metadata": metadata_by_file[filename],
+                "status": "success"
+            })
+        
+        if members:
+            # The unpack job owns (and removes) the archive from here on
+            submit_io(_unpack_archive, archive_path, members, results)
+            handed_off = True
+        else:
+            for result in results:
+                record_result(manifest_logger, result)
+    finally:
+        if not handed_off and os.path.exists(archive_path):
+            os.remove(archive_path)
+        # Release names the batch didn't take so the single-file fallback reuses them
+        for filename, file_path in target_paths.items():
+            if filename not in handled:
+                _dir_cache[local_folder].discard(os.path.basename(file_path).lower())
+        # Clear the selection so per-file fallbacks only download their own row
+        try:
+            page_obj.evaluate("() => window.__vmr.clearSelection()")
+        except:
+            pass
+    
+    return handled
+
 def download_file_with_metadata(page_obj, filename, file_path, folder_path):
     """Download a single file and its metadata."""
-    print(f"    Downloading: {filename}")
+    logger.info("    Downloading: %s", filename)
     
     try:
 
         metadata = extract_file_metadata(page_obj, filename)
-
-        # SAFETY CHECK: Remove any Locator objects that might have snuck in
-        clean_metadata = {}
-        for key, value in metadata.items():
-            if str(type(value).__name__) == "Locator":
-                print(f"      [WARNING] Removing Locator object from key: {key}")
-                continue
-            clean_metadata[key] = value
-        metadata = clean_metadata
-        # Wait a bit more to ensure files are visible
-        page_obj.wait_for_timeout(1000)
-        
-        # Find file row - multiple strategies
-        row = None
-        
-        # Strategy 1: Exact text match
-        row_locator = page_obj.locator("tr").filter(has_text=filename)
-        if row_locator.count() > 0:
-            row = row_locator.first
-        
-        # Strategy 2: Partial match
-        if not row:
-            row_locator = page_obj.locator("tr").filter(has_text=re.compile(re.escape(filename[:20]), re.I))
-            if row_locator.count() > 0:
-                row = row_locator.first
-        
-        # Strategy 3: Find via span and get parent row
-        if not row:
-            span = page_obj.locator("span.mail-sender").filter(has_text=filename)
-            if span.count() > 0:
-                row = span.first.locator("xpath=ancestor::tr")
-                if row.count() > 0:
-                    row = row.first
-        
-        if not row:
-            print(f"      ✗ File not visible in grid: {filename}")
-            return None
         
-        # Extract metadata first
-       
+        # Clear any leftover selection, find the file's row and tick it in one round-trip
+        row_state = page_obj.evaluate("(name) => window.__vmr.tickRow(name)", filename)
         
-        # Select checkbox
-        checkbox = row.locator("input[type='checkbox']")
-        if checkbox.count() > 0:
-            checkbox.first.check()
-            page_obj.wait_for_timeout(2000)  # Wait for toolbar to enable
+        if row_state == "no-row":
+            logger.warning("      ✗ File not visible in grid: %s", filename)
+            return None
+        if row_state == "ticked":
+            wait_for_toolbar(page_obj)
         
         # Find and click download button
-        dl_btn = page_obj.locator("a#multipleFile_download")
-        
-        if dl_btn.count() == 0 or not dl_btn.first.is_visible():
-            dl_btn = page_obj.locator("i.fa-download.mutiplefiledownloadiconclr").locator("xpath=ancestor::a")
-        
-        if dl_btn.count() == 0:
-            print(f"      ✗ Download button not found")
+        dl_btn = find_download_button(page_obj)
+        if dl_btn is None:
+            logger.warning("      ✗ Download button not found")
             return None
         
         # Download file
         try:
             with page_obj.expect_download(timeout=60000) as download_info:
                 dl_btn.first.click(force=True)
-                page_obj.wait_for_timeout(500)
-                
-                # Click OK button in the download confirmation modal
-                ok_btn = page_obj.locator("button[data-bb-handler='confirm'], button.btn-primary:has-text('OK')")
-                if ok_btn.count() > 0 and ok_btn.first.is_visible():
-                    ok_btn.first.click()
-                    page_obj.wait_for_timeout(500)
+                confirm_download_modal(page_obj)
             
             download = download_info.value
-            download.save_as(file_path)
+            tmp_path = download.path()
             
-            # AUTO-EXTRACTION LOGIC: VMR often wraps single files in ZIPs
-            if zipfile.is_zipfile(file_path):
-                print(f"      [Info] ZIP wrapping detected, extracting...")
-                temp_extract_dir = os.path.join(OUTPUT_DIR, "temp_extract_" + str(int(time.time())))
-                os.makedirs(temp_extract_dir, exist_ok=True)
+            # AUTO-EXTRACTION LOGIC: VMR often wraps single files in ZIPs; the wrapped
+            # entry is streamed straight out of Playwright's temp file
+            best_match = None
+            if (tmp_path and not filename.lower().endswith(".zip")
+                    and _looks_like_zip(tmp_path) and zipfile.is_zipfile(tmp_path)):
+                logger.debug("      ZIP wrapping detected, extracting...")
+                part_path = file_path + ".part"
                 
                 try:
-                    with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                        zip_ref.extractall(temp_extract_dir)
-                    
-                    # Find the most likely correct file in the extracted contents
-                    # Look for exact match first, then same extension, then just any file
-                    extracted_files = []
-                    for root, dirs, files in os.walk(temp_extract_dir):
-                        for f in files:
-                            extracted_files.append(os.path.join(root, f))
+                    with zipfile.ZipFile(tmp_path, 'r') as zip_ref:
+                        # Only an exact name match counts: .docx/.xlsx/.pptx are ZIPs
+                        # themselves and are saved as-is when nothing inside matches
+                        best_match = next(
+                            (m for m in zip_ref.infolist()
+                             if not m.is_dir() and os.path.basename(m.filename) == filename),
+                            None
+                        )
+                        if best_match is not None:
+                            with zip_ref.open(best_match) as src, open(part_path, "wb") as dst:
+                                shutil.copyfileobj(src, dst)
                     
-                    if extracted_files:
-                        # Find best match
-                        best_match = extracted_files[0]
-                        for f in extracted_files:
-                            if os.path.basename(f) == filename:
-                                best_match = f
-                                break
-                        
-                        # Replace the ZIP with the actual file
-                        os.remove(file_path)
-                        shutil.move(best_match, file_path)
-                        print(f"      ✓ Extracted and saved: {filename}")
-                    else:
-                        print(f"      ✗ ZIP was empty!?")
-                        
+                    if best_match is not None:
+                        os.replace(part_path, file_path)
+                        logger.info("      ✓ Extracted and saved: %s", filename)
                 finally:
-                    # Clean up temp directory
-                    if os.path.exists(temp_extract_dir):
-                        shutil.rmtree(temp_extract_dir)
-            else:
-                print(f"      ✓ Downloaded: {filename}")
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+            
+            if best_match is None:
+                save_download(download, file_path)
+                logger.info("      ✓ Downloaded: %s", filename)
             
         except Exception as e:
-            print(f"      ✗ Download failed: {e}")
+            logger.warning("      ✗ Download failed: %s", e)
             return None
         
-        # Save metadata
-        if metadata:
-            metadata_file = os.path.join(
-                METADATA_DIR,
-                folder_path.replace(os.sep, "_") + "_" + filename + ".json"
-            )
-            with open(metadata_file, "w", encoding="utf-8") as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
-        
-        # Uncheck to prepare for next file
-        if checkbox.count() > 0:
-            checkbox.first.uncheck()
-            page_obj.wait_for_timeout(500)
+        # Save metadata (the next file's lookup clears this selection)
+        save_metadata(metadata, folder_path, filename)
         
         return {
             "filename": filename,
+            "local_name": os.path.basename(file_path),
             "path": file_path,
             "metadata": metadata,
             "status": "success"
         }
         
     except Exception as e:
-        print(f"      ✗ Error downloading {filename}: {e}")
+        logger.warning("      ✗ Error downloading %s: %s", filename, e)
         return None
 
-def download_folder_recursive(page_obj, current_path, output_base, results):
-    """Recursively download all files in a folder and its subfolders."""
+def download_folder_files(page_obj, current_path, output_base, manifest_logger):
+    """Download the files of the folder the page is showing; returns its subfolder names."""
     
     path_str = " > ".join(current_path)
     print(f"\n[Processing] {path_str}")
     
     # Get current folder contents
-    folders, files = get_grid_items(page_obj)
+    folders, files = get_grid_items(page_obj, current_path)
     print(f"  Found: {len(folders)} folders, {len(files)} files")
     
     # Create local folder structure
-    local_folder = os.path.join(output_base, *current_path[1:])  # Skip "Group or Department"
-    os.makedirs(local_folder, exist_ok=True)
+    local_folder = os.path.join(output_base, *map(sanitize_filename, current_path[1:]))  # Skip "Group or Department"
+    ensure_dir(local_folder)
+    _dir_cache.pop(local_folder, None)
     
     # Download all files in current folder
+    files = [f for f in files if f not in SKIP_NAMES]
     if files:
+        # Files a previous run finished keep their names but aren't fetched again
+        pending = []
+        occurrences = {}
+        for filename in files:
+            occurrence = occurrences.get(filename, 0)
+            occurrences[filename] = occurrence + 1
+            if manifest_logger.is_done(local_folder, filename, occurrence):
+                get_unique_local_path(local_folder, filename)
+            else:
+                pending.append(filename)
+        if len(pending) < len(files):
+            print(f"  Skipping {len(files) - len(pending)} files from previous run")
+        files = pending
         print(f"  Downloading {len(files)} files...")
+        
+        # One bulk download per folder (a lone file arrives unwrapped); anything it
+        # misses is fetched one by one. Repeated names can't be told apart by the
+        # name-based selection, so they always take the single-file path.
+        downloaded = set()
+        name_counts = Counter(files)
+        batch = [f for f in files if name_counts[f] == 1]
+        if batch:
+            try:
+                downloaded = download_files_as_archive(page_obj, batch, local_folder, output_base, manifest_logger)
+            except Exception as e:
+                print(f"  [Warning] Batch download failed, falling back to single files: {e}")
+        
         for filename in files:
-            if filename in ["My Records", "My Activity", "Group or Department"]:
+            if filename in downloaded:
                 continue
             
-            file_path = os.path.join(local_folder, filename)
+            file_path = get_unique_local_path(local_folder, filename)
             relative_path = os.path.relpath(file_path, output_base)
             
             result = download_file_with_metadata(page_obj, filename, file_path, relative_path)
             if result:
-                results.append(result)
+                record_result(manifest_logger, result)
+        
+        flush_folder_metadata(os.path.relpath(local_folder, output_base))
     
-    # Process subfolders
-    if folders:
-        print(f"  Processing {len(folders)} subfolders...")
-        for idx, folder in enumerate(folders):
-            print(f"\n  [{idx+1}/{len(folders)}] Entering: {folder}")
-            
+    return folders
+
+def download_folder_recursive(page_obj, current_path, output_base, manifest_logger, descend=True):
+    """Download all files in a folder and its subfolders.
+    
+    The page must already show current_path. The tree is walked depth-first
+    from an explicit stack, opening each folder by replaying the SPA call cached
+    when its parent was scanned, so nothing ever navigates back to a parent.
+    With descend=False only the folder's own files are downloaded; the
+    subfolder names are returned so the caller can dispatch them.
+    """
+    root_depth = len(current_path)
+    folders = download_folder_files(page_obj, current_path, output_base, manifest_logger)
+    if not descend:
+        drain_io_jobs(manifest_logger, wait=True)
+        return folders
+    
+    # Reversed so folders are visited in grid order
+    pending = [current_path + [folder] for folder in reversed(folders)]
+    visited = 0
+    while pending:
+        path = pending.pop()
+        
+        # Previous top-level folder done: a clean point for a full collection
+        if len(path) == root_depth + 1:
+            gc.collect()
+        
+        visited += 1
+        recycled = False
+        if CONTEXT_RECYCLE_EVERY and visited % CONTEXT_RECYCLE_EVERY == 0:
             try:
-                # Enter subfolder
-                click_folder(page_obj, folder)
-                
-                # Recurse
-                download_folder_recursive(
-                    page_obj,
-                    current_path + [folder],
-                    output_base,
-                    results
-                )
-                
-                # Navigate back - use back button
-                print(f"  Returning to: {path_str}")
-                page_obj.go_back(wait_until="domcontentloaded")
-                page_obj.wait_for_timeout(2000)
-                
-                # Verify we're back
-                if not wait_for_grid(page_obj):
-                    print("  [Warning] Grid didn't load after back, resetting...")
-                    navigate_to_path(page_obj, current_path)
-                
+                page_obj = recycle_page(page_obj)
+                recycled = True
             except Exception as e:
-                print(f"  [Error] Failed to process subfolder '{folder}': {e}")
-                # Try to recover by navigating back to current path
+                print(f"  [Warning] Context recycle failed, keeping current page: {e}")
+        
+        try:
+            # Without a cached call the locator would search whatever grid is showing,
+            # and a recycled page is blank, so both navigate from root instead
+            if recycled or tuple(path) not in FOLDER_CALLS:
+                _retry(lambda attempt: navigate_to_path(page_obj, path))
+            else:
                 try:
-                    navigate_to_path(page_obj, current_path)
-                except:
-                    print("  [Critical] Failed to recover, skipping remaining subfolders")
+                    _retry(lambda attempt: click_folder(page_obj, path[-1], path))
+                except Exception as e:
+                    print(f"  [Warning] Direct entry failed, walking from root: {e}")
+                    _retry(lambda attempt: navigate_to_path(page_obj, path))
+            
+            subfolders = download_folder_files(page_obj, path, output_base, manifest_logger)
+            pending.extend(path + [folder] for folder in reversed(subfolders))
+        except Exception as e:
+            print(f"  [Error] Skipping folder '{' > '.join(path)}': {e}")
+        
+        drain_io_jobs(manifest_logger)
+    
+    drain_io_jobs(manifest_logger, wait=True)
+    return folders
+
+# -----------------------------
+# MANIFEST LOGGING
+# -----------------------------
+class ManifestLogger:
+    """Appends download results to a JSONL file through one buffered handle."""
+    
+    def __init__(self, log_file, fsync_every_n=0, resume_from=None):
+        self.log_file = log_file
+        self.fsync_every_n = fsync_every_n
+        self._count = 0
+        # (local folder, filename, occurrence) -> path of successes still on disk
+        self._completed = {}
+        if resume_from and os.path.exists(resume_from):
+            self._load_completed(resume_from)
+        # Appends when resuming its own log, otherwise truncates; kept open until close()
+        mode = "a" if resume_from == log_file else "w"
+        self._fh = open(log_file, mode, encoding="utf-8", buffering=1 << 16)
+        if mode == "a" and self._fh.tell() > 0:
+            self._fh.write("\n")  # never glue onto a torn last line
+    
+    def _load_completed(self, log_file):
+        seen = {}
+        with open(log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json_loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                if entry.get("status") != "success" or not os.path.exists(entry["path"]):
+                    continue
+                folder = os.path.dirname(entry["path"])
+                occurrence = seen.get((folder, entry["filename"]), 0)
+                seen[(folder, entry["filename"])] = occurrence + 1
+                self._completed[(folder, entry["filename"], occurrence)] = entry["path"]
+        if self._completed:
+            print(f"Resuming: {len(self._completed)} files already downloaded")
+    
+    def is_done(self, folder, filename, occurrence):
+        """True if a previous run already downloaded this file."""
+        return (folder, filename, occurrence) in self._completed
+    
+    def completed_paths(self):
+        return list(self._completed.values())
+    
+    def log(self, entry):
+        """Buffer one result line; fsync every fsync_every_n entries when set."""
+        self._fh.write(json_dumps(entry))
+        self._fh.write("\n")
+        self._count += 1
+        if self.fsync_every_n and self._count % self.fsync_every_n == 0:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+    
+    def get_all_results(self):
+        """Read back every logged result."""
+        if not self._fh.closed:
+            self._fh.flush()
+        results = []
+        with open(self.log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        results.append(json_loads(line))
+                    except ValueError:
+                        pass  # torn line left by an interrupted run
+        return results
+    
+    def close(self):
+        if not self._fh.closed:
+            self._fh.flush()
+            self._fh.close()
+
+def fold_leftover_shards(log_file):
+    """Appends worker shards an interrupted run never merged to log_file, then drops them."""
+    log_dir = os.path.dirname(log_file) or "."
+    prefix, suffix = os.path.splitext(os.path.basename(log_file))
+    folded = 0
+    with open(log_file, "a", encoding="utf-8") as out:
+        if out.tell() > 0:
+            out.write("\n")  # never glue onto a torn last line
+        for name in sorted(os.listdir(log_dir)):
+            if not (name.startswith(prefix + ".") and name.endswith(suffix)) or name == os.path.basename(log_file):
+                continue
+            shard_file = os.path.join(log_dir, name)
+            with open(shard_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        out.write(line if line.endswith("\n") else line + "\n")
+                        folded += 1
+            os.remove(shard_file)
+    if folded:
+        print(f"Recovered {folded} results from unmerged worker shards")
+
+# -----------------------------
+# ARCHIVE WRITER
+# -----------------------------
+# Already-compressed formats gain nothing from DEFLATE, so they are stored as-is
+_INCOMPRESSIBLE = {
+    ".pdf", ".jpg", ".jpeg", ".png", ".zip", ".gz", ".mp4", ".mp3", ".docx", ".xlsx", ".pptx",
+    ".7z", ".rar", ".webp", ".mov"
+}
+
+def _archive_entry(file_path):
+    """(path, arcname) queue item; arcnames are relative to OUTPUT_DIR."""
+    return (file_path, os.path.relpath(file_path, OUTPUT_DIR))
+
+class ArchiveWriter:
+    """Streams finished files into the migration ZIP on a background thread.
+    
+    Pass a multiprocessing queue as work_queue to let pool workers feed it directly.
+    """
+    
+    def __init__(self, zip_path, work_queue=None):
+        self.zip_path = zip_path
+        self._queue = work_queue if work_queue is not None else queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = self._executor.submit(self._run)
+        self._closed = False
+    
+    def add(self, file_path):
+        """Queue a file for archiving under its path relative to OUTPUT_DIR."""
+        self._queue.put(_archive_entry(file_path))
+    
+    def close(self):
+        """Flush the queue, finalize the ZIP and return the number of archived files.
+        
+        Only the first call reports the outcome (or raises the writer's error);
+        later calls, e.g. from cleanup code, just return None.
+        """
+        if self._closed:
+            return None
+        self._closed = True
+        self._queue.put(None)
+        self._executor.shutdown(wait=True)
+        return self._future.result()
+    
+    def _run(self):
+        archived = set()
+        with zipfile.ZipFile(self.zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            while True:
+                item = self._queue.get()
+                if item is None:
                     break
+                file_path, arcname = item
+                if arcname in archived:
+                    continue
+                ext = os.path.splitext(file_path)[1].lower()
+                try:
+                    if ext in _INCOMPRESSIBLE:
+                        zipf.write(file_path, arcname, compress_type=zipfile.ZIP_STORED)
+                    else:
+                        zipf.write(file_path, arcname, compress_type=zipfile.ZIP_DEFLATED, compresslevel=1)
+                    archived.add(arcname)
+                except Exception as e:
+                    print(f"  [Warning] Failed to archive {arcname}: {e}")
+        return len(archived)
+
+ARCHIVE_WRITER = None
+# Set in pool workers: the parent ArchiveWriter's queue, so files are zipped as they land
+ARCHIVE_QUEUE = None
+
+def _init_worker(archive_queue):
+    global ARCHIVE_QUEUE
+    ARCHIVE_QUEUE = archive_queue
+
+def record_result(manifest_logger, result):
+    """Logs a finished download and hands it to the archive writer."""
+    manifest_logger.log(result)
+    if ARCHIVE_WRITER is not None:
+        ARCHIVE_WRITER.add(result["path"])
+    elif ARCHIVE_QUEUE is not None:
+        ARCHIVE_QUEUE.put(_archive_entry(result["path"]))
 
 # -----------------------------
 # MAIN MIGRATION FUNCTION
 # -----------------------------
+def _filter_resources(route, request):
+    """Abort requests for assets the migration never looks at."""
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        route.abort()
+    else:
+        route.continue_()
+
+def create_context(browser, storage_state=None, restore_session=True):
+    """New download-ready context, restoring the saved session when present (and wanted)."""
+    if storage_state is None and restore_session and os.path.exists(AUTH_STATE):
+        storage_state = AUTH_STATE
+    context = browser.new_context(
+        viewport={"width": 1920, "height": 1080},
+        accept_downloads=True,
+        user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        storage_state=storage_state
+    )
+    context.add_init_script(PAGE_HELPERS_JS)
+    if BLOCKED_RESOURCE_TYPES:
+        context.route(ASSET_URL_RE, _filter_resources)
+    return context
+
+def recycle_page(page_obj):
+    """Closes the page's context and returns a blank page in a fresh one with the same session."""
+    context = page_obj.context
+    new_context = create_context(context.browser, storage_state=context.storage_state())
+    page = new_context.new_page()
+    register_session_conflict_handler(page)
+    PAGE_PATHS.pop(page_obj, None)
+    context.close()
+    print("  Recycled browser context")
+    return page
+
+def migrate_subtree(path):
+    """Pool worker: download one top-level subtree; returns its results shard path."""
+    # A worker can take several subtrees, so the shard name is unique per call
+    shard_file = os.path.join(OUTPUT_DIR, f"results.{os.getpid()}.{time.time_ns()}.jsonl")
+    manifest_logger = ManifestLogger(shard_file, resume_from=RESULTS_LOG if RESUME else None)
+    start_metadata_writer()
+    gc.set_threshold(*GC_THRESHOLD)
+    
+    # Sync Playwright is not thread-safe, so every worker process owns a browser
+    with sync_playwright() as pw:
+        browser = pw.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+        # Never the shared vmr_auth.json: pages on one session would fight over its folder view
+        page = create_context(browser, restore_session=False).new_page()
+        register_session_conflict_handler(page)
+        
+        try:
+            if not login_to_vmr(page):
+                print(f"✗ Worker login failed for: {' > '.join(path)}")
+            else:
+                navigate_to_path(page, path)
+                download_folder_recursive(page, path, OUTPUT_DIR, manifest_logger)
+        except Exception as e:
+            print(f"\n✗ Subtree error in {' > '.join(path)}: {e}")
+        finally:
+            manifest_logger.close()
+            stop_metadata_writer()
+        
+        browser.close()
+    
+    gc.collect()
+    return shard_file
+
 def run_migration():
     """Main migration: Download entire folder structure with metadata."""
+    global ARCHIVE_WRITER
     
     print("=" * 70)
     print("VMR COMPLETE MIGRATION TOOL")
     print("Downloads full folder structure with metadata")
     print("=" * 70)
     
-    results = []
+    if RESUME:
+        fold_leftover_shards(RESULTS_LOG)
+    manifest_logger = ManifestLogger(RESULTS_LOG, resume_from=RESULTS_LOG if RESUME else None)
     
     with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=True)
-        context = browser.new_context(
-            viewport={"width": 1920, "height": 1080},
-            accept_downloads=True,
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        )
+        browser = pw.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+        context = create_context(browser)
         page = context.new_page()
+        register_session_conflict_handler(page)
         
         # Login
         if not login_to_vmr(page):
             print("✗ Login failed, aborting")
             browser.close()
+            manifest_logger.close()
             return
         
+        # Persist the session so the next run skips the login form
+        context.storage_state(path=AUTH_STATE)
+        
         # Navigate to root folder
         print("\nNavigating to root folder...")
         if not wait_for_grid(page):
             print("✗ Grid didn't load")
             browser.close()
+            manifest_logger.close()
             return
         
         try:
-            click_folder(page, "Group or Department")
+            # Caches the root folder calls so this click and later jumps skip the locator
+            get_grid_items(page, [])
+            click_folder(page, "Group or Department", ["Group or Department"])
         except Exception as e:
             print(f"✗ Failed to enter root: {e}")
             browser.close()
+            manifest_logger.close()
             return
         
+        # Start the archive writer so compression overlaps the downloads
+        print(f"\nStreaming ZIP archive: {ZIP_OUTPUT}")
+        # With workers, the writer reads a process-shared queue they feed directly
+        mp_context = multiprocessing.get_context("spawn")
+        archive_queue = mp_context.Queue() if PW_WORKERS > 1 else None
+        ARCHIVE_WRITER = ArchiveWriter(ZIP_OUTPUT, work_queue=archive_queue)
+        for path in manifest_logger.completed_paths():
+            ARCHIVE_WRITER.add(path)
+        start_metadata_writer()
+        
         # Start recursive download
+        root_path = ["Group or Department"]
+        gc_threshold = gc.get_threshold()
+        gc.set_threshold(*GC_THRESHOLD)
         try:
-            download_folder_recursive(
-                page,
-                ["Group or Department"],
-                OUTPUT_DIR,
-                results
-            )
+            if PW_WORKERS <= 1:
+                download_folder_recursive(page, root_path, OUTPUT_DIR, manifest_logger)
+            else:
+                # Root files here, each top-level subtree in a worker process
+                subfolders = download_folder_recursive(page, root_path, OUTPUT_DIR, manifest_logger, descend=False)
+                if subfolders:
+                    workers = min(PW_WORKERS, len(subfolders))
+                    print(f"\nDispatching {len(subfolders)} subfolders to {workers} workers...")
+                    with mp_context.Pool(workers, initializer=_init_worker, initargs=(archive_queue,)) as pool:
+                        subtrees = [root_path + [folder] for folder in subfolders]
+                        for shard_file in pool.imap_unordered(migrate_subtree, subtrees):
+                            # Fold the worker's shard into the main log (its files are
+                            # already queued for the ZIP), then drop it
+                            with open(shard_file, "r", encoding="utf-8") as f:
+                                for line in f:
+                                    if line.strip():
+                                        manifest_logger.log(json_loads(line))
+                            os.remove(shard_file)
+                            gc.collect()
+                        # Workers flush their queue feeders on exit, before the writer is closed
+                        pool.close()
+                        pool.join()
         except Exception as e:
             print(f"\n✗ Migration error: {e}")
-        
-        browser.close()
+        except BaseException:
+            # Never leave the writer thread blocking interpreter exit
+            ARCHIVE_WRITER.close()
+            ARCHIVE_WRITER = None
+            raise
+        finally:
+            gc.set_threshold(*gc_threshold)
+            browser.close()
+            manifest_logger.close()
+            stop_metadata_writer()
+    
+    results = manifest_logger.get_all_results()
     
     # Create summary report
     print("\n" + "=" * 70)
@@ -659,29 +1519,35 @@ def run_migration():
     
     # Save results manifest
     manifest_file = os.path.join(OUTPUT_DIR, "migration_manifest.json")
-    with open(manifest_file, "w", encoding="utf-8") as f:
-        json.dump({
-            "timestamp": datetime.now().isoformat(),
-            "total_files": len(results),
-            "files": results
-        }, f, indent=2, ensure_ascii=False)
+    manifest = {
+        "timestamp": datetime.now().isoformat(),
+        "total_files": len(results),
+        "files": results
+    }
+    if orjson is not None:
+        with open(manifest_file, "wb") as f:
+            f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+    else:
+        with open(manifest_file, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
     
     print(f"Manifest saved: {manifest_file}")
     
-    # Create ZIP archive
-    print(f"\nCreating ZIP archive: {ZIP_OUTPUT}")
+    # Finish ZIP archive: downloads are already in, add metadata and manifest
+    print(f"\nFinalizing ZIP archive: {ZIP_OUTPUT}")
     try:
-        with zipfile.ZipFile(ZIP_OUTPUT, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(OUTPUT_DIR):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, OUTPUT_DIR)
-                    zipf.write(file_path, arcname)
-        
-        print(f"✓ ZIP created successfully: {ZIP_OUTPUT}")
+        for file_path in _iter_files(METADATA_DIR):
+            ARCHIVE_WRITER.add(file_path)
+        ARCHIVE_WRITER.add(manifest_file)
+        archived = ARCHIVE_WRITER.close()
+        
+        print(f"✓ ZIP created successfully: {ZIP_OUTPUT} ({archived} files)")
         print(f"  Size: {os.path.getsize(ZIP_OUTPUT) / 1024 / 1024:.2f} MB")
     except Exception as e:
         print(f"✗ Failed to create ZIP: {e}")
+    finally:
+        ARCHIVE_WRITER.close()
+        ARCHIVE_WRITER = None
     
     print("\n✓ Migration complete!")
 
@@ -689,4 +1555,11 @@ def run_migration():
 # ENTRY POINT
 # -----------------------------
 if __name__ == "__main__":
-    run_migration()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Migrate the VMR folder tree with metadata.")
+    parser.add_argument("--no-metadata", action="store_true",
+                        help="download files only, skipping the metadata panel")
+    args = parser.parse_args()
+    if args.no_metadata:
+        SKIP_METADATA = True
+        os.environ["VMR_NO_METADATA"] = "1"
+    run_migration()
@@ -1,8 +1,485 @@
 import os
+import sys
 import json
 import re
 import shutil
 import csv
+import errno
+import stat
+import zipfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from operator import itemgetter
+
+# Stream the source manifest when ijson is installed (prefer the C backend)
+try:
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    try:
+        import ijson
+    except ImportError:
+        ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Errors meaning "this kernel/filesystem can't do that copy", not a real I/O failure
+_COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+                     getattr(errno, "ENOTSOCK", errno.EINVAL),
+                     getattr(errno, "EOPNOTSUPP", errno.EINVAL), getattr(errno, "ENOTSUP", errno.EINVAL)}
+
+def _copy_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+def _send_range(src_fd, dst_fd, offset, count):
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+_KERNEL_COPIERS = []
+if hasattr(os, "copy_file_range"):
+    _KERNEL_COPIERS.append(_copy_range)
+# Only Linux sendfile takes a regular file as output; macOS/BSD want a socket
+if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+    _KERNEL_COPIERS.append(_send_range)
+
+def _kernel_copy(src_fd, dst_fd, size):
+    """Copy size bytes between fds without a user-space buffer. False if no method copied it all."""
+    for copier in _KERNEL_COPIERS:
+        offset = 0
+        try:
+            while offset < size:
+                n = copier(src_fd, dst_fd, offset, size - offset)
+                if n == 0:
+                    break
+                offset += n
+        except OSError as e:
+            # Only fall back if nothing has been written yet
+            if offset == 0 and e.errno in _COPY_UNSUPPORTED:
+                continue
+            raise
+        if offset == size:
+            return True
+        if offset == 0:
+            # Some filesystems (procfs, FUSE, cross-fs) answer 0 straight away; try the next one
+            continue
+        # Short copy part-way through: let the caller redo it in user space
+        return False
+    return False
+
+def _win_copy(src, dst):
+    """Let Windows do the copy (CopyFileExW keeps timestamps/attributes). False if unavailable."""
+    try:
+        import ctypes
+        copy_file_ex = ctypes.windll.kernel32.CopyFileExW
+    except (ImportError, AttributeError):
+        return False
+    return bool(copy_file_ex(src, dst, None, None, None, 0))
+
+COPY_BUFSIZE = 1 << 20  # 1 MiB: ~128x fewer read/write calls than the 8 KiB default
+
+LINK_MODES = ("copy", "hardlink", "reflink", "auto")
+
+_FICLONE = 0x40049409  # Linux ioctl: share src's extents with dst (Btrfs/XFS)
+
+def _hardlink(src, dst):
+    """Point dst at src's inode, replacing an older copy left by a previous run."""
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        os.remove(dst)
+        os.link(src, dst)
+
+def _reflink(src, dst):
+    """Clone src into dst without copying data; False where the filesystem can't."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            return False
+    return True
+
+def _is_link_to(dst_st, src_st, src):
+    """True if dst (already stat'ed, None if missing) is a hardlink to src."""
+    # Only a multiply-linked dst can be one, so plain copies pay no extra stat
+    if dst_st is None or dst_st.st_nlink < 2:
+        return False
+    if src_st.st_ino:
+        return dst_st.st_ino == src_st.st_ino and dst_st.st_dev == src_st.st_dev
+    # Windows DirEntry stats leave st_ino/st_dev at 0
+    return os.path.samestat(dst_st, os.stat(src))
+
+def _place_file(src, dst, src_st, link_mode, preserve_mode=False):
+    """Put src at dst according to link_mode, falling back to a real copy; returns what was done."""
+    if link_mode == "hardlink":
+        try:
+            _hardlink(src, dst)
+            return "Linked"
+        except OSError:
+            pass  # EXDEV, or a filesystem without hardlinks
+    if link_mode == "reflink" and _reflink(src, dst):
+        _copy_times(dst, src_st, preserve_mode)
+        return "Cloned"
+    _fast_copy(src, dst, src_st, preserve_mode)
+    return "Copied"
+
+def _buffered_copy(src, dst):
+    """User-space copy in 1 MiB chunks, asking the OS for sequential read-ahead on the source."""
+    # O_SEQUENTIAL is FILE_FLAG_SEQUENTIAL_SCAN on Windows; fadvise covers Linux
+    flags = os.O_RDONLY | getattr(os, "O_BINARY", 0) | getattr(os, "O_SEQUENTIAL", 0)
+    src_fd = os.open(src, flags)
+    with open(src_fd, "rb", buffering=0) as fsrc, open(dst, "wb", buffering=0) as fdst:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(src_fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        shutil.copyfileobj(fsrc, fdst, length=COPY_BUFSIZE)
+        if hasattr(os, "posix_fadvise"):
+            # One-shot reads: don't let a migration bigger than RAM evict the page cache
+            os.posix_fadvise(src_fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+def _copy_times(dst, src_st, preserve_mode=False):
+    """Carry the source's timestamps (and permission bits if asked) over from a cached stat."""
+    os.utime(dst, ns=(src_st.st_atime_ns, src_st.st_mtime_ns))
+    if preserve_mode:
+        os.chmod(dst, stat.S_IMODE(src_st.st_mode))
+
+def _fast_copy(src, dst, src_st=None, preserve_mode=False):
+    """Copy src to dst keeping the bytes in the kernel where possible, preserving timestamps."""
+    if src_st is None:
+        src_st = os.stat(src)
+    if os.name == "nt":
+        if _win_copy(src, dst):
+            return
+    elif _KERNEL_COPIERS:
+        # copy_file_range can reflink on Btrfs/XFS; sendfile still skips Python buffers
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            copied = _kernel_copy(fsrc.fileno(), fdst.fileno(), src_st.st_size)
+        if copied:
+            _copy_times(dst, src_st, preserve_mode)
+            return
+    # Only mtime matters to the import, so skip copystat's chmod/xattr calls
+    _buffered_copy(src, dst)
+    _copy_times(dst, src_st, preserve_mode)
+
+def _unwrap_zip(src, dst, filename, src_st, preserve_mode=False):
+    """Stream filename out of src if VMR saved it wrapped in a ZIP; False if src isn't such a wrapper."""
+    if filename.lower().endswith(".zip"):
+        return False
+    with open(src, "rb") as f:
+        if f.read(4) != b"PK\x03\x04":
+            return False
+    # Only an exact name match counts: .docx/.xlsx are ZIPs too and must be copied as-is
+    try:
+        with zipfile.ZipFile(src) as z:
+            member = next((m for m in z.infolist()
+                           if not m.is_dir() and os.path.basename(m.filename) == filename), None)
+            if member is None:
+                return False
+            with z.open(member) as zsrc, open(dst, "wb") as zdst:
+                shutil.copyfileobj(zsrc, zdst, length=COPY_BUFSIZE)
+    except zipfile.BadZipFile:
+        return False
+    _copy_times(dst, src_st, preserve_mode)
+    return True
+
+def _stat_or_none(path):
+    try:
+        return os.stat(path)
+    except FileNotFoundError:
+        return None
+
+def _is_up_to_date(dst_st, src_st):
+    """True if dst (already stat'ed, None if missing) is a finished copy of the source."""
+    if dst_st is None:
+        return False
+    if dst_st.st_mtime_ns == src_st.st_mtime_ns:
+        # Stamped by a finished copy or unwrap (times are set last). ZIP-wrapped
+        # sources never match on size, so this is what lets re-runs skip them.
+        return True
+    return dst_st.st_size == src_st.st_size and dst_st.st_mtime >= src_st.st_mtime
+
+def build_source_index(root):
+    """Map every file under root to its DirEntry, keyed by the tuple of path parts below root."""
+    index = {}
+    stack = [(root, ())]
+    while stack:
+        path, parts = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, parts + (entry.name,)))
+                    else:
+                        index[parts + (entry.name,)] = entry
+        except FileNotFoundError:
+            continue
+    return index
+
+def _log(ctx, *lines):
+    """Print a block of lines without interleaving with other copy workers."""
+    with ctx["print_lock"]:
+        print("\n".join(lines))
+
+_SPLIT_RE = re.compile(r"[/\\]")
+
+# Characters that make skip_regex an actual pattern rather than plain text
+_REGEX_META = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+def _skip_matcher(skip_regex):
+    """Return a callable telling whether a folder name matches skip_regex (None if unset)."""
+    if not skip_regex:
+        return None
+    if not _REGEX_META.search(skip_regex):
+        # Plain text: re.match would only ever do a prefix compare
+        return lambda part: part.startswith(skip_regex)
+    return re.compile(skip_regex).match
+
+class UniqueNamer:
+    """Hands out collision-free file names per target directory (case-insensitive, thread-safe)."""
+    
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+        
+    def claim(self, directory, filename):
+        """Reserve filename in directory, suffixing ' (n)' if an earlier file already took it."""
+        base, ext = os.path.splitext(filename)
+        with self._lock:
+            claimed = self._cache.setdefault(directory, set())
+            candidate = filename
+            counter = 1
+            while candidate.lower() in claimed:
+                candidate = f"{base} ({counter}){ext}"
+                counter += 1
+            claimed.add(candidate.lower())
+        return candidate
+
+def _make_target_dirs(dirs, made):
+    """Create a set of directories with one makedirs per leaf; parents come along for free.
+    
+    made is the set of directories already known to exist; it is updated in place.
+    """
+    for d in sorted(dirs, key=len, reverse=True):
+        if d in made:
+            continue
+        os.makedirs(d, exist_ok=True)
+        # Everything above d exists now, so later (shorter) entries can be skipped
+        while d not in made:
+            made.add(d)
+            parent = os.path.dirname(d)
+            if parent == d:
+                break
+            d = parent
+
+def _plan_entry(entry, ctx):
+    """Work out the source and target paths for one manifest entry (None if unmappable)."""
+    old_path = entry["path"]
+    
+    # Determine relative path starting at the business root ("HR")
+    # Manifest path example:
+    #   vmr_downloads\HR\Live Employee\1997\11_Nov\E SAHILJADHAV(12345)\Internal Use\MAVROS (1).pdf
+    # Actual disk path example:
+    #   Group or Department\HR\Live Employee\1997\11_Nov\E SAHILJADHAV(12345)\Internal Use\MAVROS (1).pdf
+    # We therefore:
+    #   1) Trim everything before "HR"
+    #   2) Use that HR-onwards segment both for:
+    #        - locating the source file under source_root
+    #        - building the new relative structure under target_root
+    # Split on either separator: manifests written on Windows get restructured in Docker too
+    parts = _SPLIT_RE.split(old_path)
+    try:
+        # Find the index of the first folder after the manifest's base directory
+        # In this case, we know the structure usually starts with HR
+        index = parts.index("HR")
+        clean_parts = parts[index:]
+    except ValueError:
+        _log(ctx, f"  [Warning] Could not find 'HR' in path: {old_path}")
+        return None
+        
+    # Apply transformation rules: drop the file name at the end, then every
+    # folder that is on the skip list (case-insensitive) or matches skip_regex.
+    # The path always ends in the file as saved on disk, which can differ from
+    # the VMR name (sanitised or " (n)"-suffixed), so the target keeps that name.
+    skip_set = ctx["skip_set"]
+    skip_match = ctx["skip_match"]
+    folders = clean_parts[:-1]
+    local_name = entry.get("local_name") or clean_parts[-1]
+    if skip_match is None:
+        new_relative_parts = [p for p in folders if p.lower().strip() not in skip_set]
+    else:
+        new_relative_parts = [p for p in folders
+                              if p.lower().strip() not in skip_set and not skip_match(p)]
+        
+    # Dropping skipped folders can land two files on the same name; suffix the later ones
+    # Roots are normalised once in ctx, so a plain os.sep.join is enough here
+    target_dir = os.sep.join((ctx["target_root"], *new_relative_parts))
+    new_filename = ctx["namer"].claim(target_dir, local_name)
+    new_relative_path = target_dir + os.sep + new_filename
+    return {
+        "entry": entry,
+        "clean_parts": clean_parts,
+        "new_filename": new_filename,
+        "new_relative_path": new_relative_path,
+        "target_dir_abs": os.sep.join((ctx["target_root_abs"], *new_relative_parts)),
+        "new_full_path": os.sep.join((ctx["target_root_abs"], *new_relative_parts, new_filename)),
+    }
+
+# Entries planned, copied and written per window: memory stays bounded by the
+# window, not the manifest, and copying starts before the whole manifest is read
+PLAN_WINDOW = 1000
+
+def _plan_windows(entries, ctx, size=PLAN_WINDOW):
+    """Yield lists of up to size plans, skipping entries that can't be mapped."""
+    window = []
+    for entry in entries:
+        plan = _plan_entry(entry, ctx)
+        if plan is None:
+            continue
+        window.append(plan)
+        if len(window) == size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+def _process_entry(plan, ctx):
+    """Copy one planned file into the new layout and return its v2 manifest entry (None on failure)."""
+    entry = plan["entry"]
+    filename = entry["filename"]
+    old_path = entry["path"]
+    new_relative_path = plan["new_relative_path"]
+    new_full_path = plan["new_full_path"]
+    
+    # Copy file (timestamps are preserved, see _fast_copy)
+    # We intentionally look the source up as:
+    #   source_root / HR\...\filename
+    # so that it matches the actual disk layout
+    src_entry = ctx["src_index"].get(tuple(plan["clean_parts"]))
+    if src_entry is None:
+        # Errors are always shown, with enough context to find the entry
+        source_full_path = os.sep.join((ctx["source_root_abs"], *plan["clean_parts"]))
+        _log(ctx, f"\nProcessing: {filename}", f"  Old: {old_path}",
+             f"  [Error] Source file missing: {source_full_path}")
+        return None
+    source_full_path = src_entry.path
+    # Free on Windows (comes with the directory listing), cached after the first call elsewhere
+    src_st = src_entry.stat()
+        
+    # One stat of the target serves both the hardlink guard and the up-to-date check
+    dst_st = _stat_or_none(new_full_path)
+    if ctx["link_mode"] != "hardlink" and _is_link_to(dst_st, src_st, source_full_path):
+        # Left by an earlier hardlink run: it carries the source's exact mtime so it would
+        # pass as up to date, and opening it "wb" would truncate the source itself
+        os.remove(new_full_path)
+        dst_st = None
+    if ctx["skip_if_newer"] and _is_up_to_date(dst_st, src_st):
+        status = "  [Skip] Already up to date"
+    # Files saved by the older engine can still be VMR's single-file ZIP wrapper
+    elif _unwrap_zip(source_full_path, new_full_path, filename, src_st, ctx["preserve_mode"]):
+        status = "  [Success] Extracted from ZIP wrapper"
+    else:
+        how = _place_file(source_full_path, new_full_path, src_st, ctx["link_mode"], ctx["preserve_mode"])
+        status = f"  [Success] {how} successfully"
+        
+    # Per-file chatter is opt-in; at 100k+ files the prints cost more than the copies
+    if ctx["verbose"]:
+        _log(ctx, f"\nProcessing: {filename}", f"  Old: {old_path}", f"  New: {new_relative_path}", status)
+    return {
+        "filename": plan["new_filename"],
+        "old_path": old_path,
+        "new_path": new_relative_path,
+        "metadata": entry["metadata"]
+    }
+
+def _iter_manifest_files(path):
+    """Yield manifest["files"] entries one at a time without loading the whole file."""
+    with open(path, "rb") as f:
+        yield from ijson.items(f, "files.item", use_float=True)
+
+def load_manifest(path):
+    """Return (header, entries): the manifest's top-level scalars and an iterator over its files."""
+    if ijson is None:
+        with open(path, "rb") as f:
+            manifest = json_loads(f.read())
+        header = {k: v for k, v in manifest.items() if k != "files"}
+        return header, iter(manifest.get("files", []))
+        
+    # The migration engine writes "timestamp" etc. before "files", so stop
+    # reading the header as soon as the file list starts
+    header = {}
+    with open(path, "rb") as f:
+        for prefix, event, value in ijson.parse(f):
+            if prefix == "" and event == "map_key" and value == "files":
+                break
+            if prefix and "." not in prefix and event in ("string", "number", "boolean", "null"):
+                header[prefix] = value
+    return header, _iter_manifest_files(path)
+
+# Indexing Manifest (CSV) columns for VMR Batch Import. Every column after
+# "File Name" is the metadata field of the same name.
+INDEXING_CSV_HEADERS = [
+    "File Name", "Classification", "Document Sub Type", "Quick Reference", 
+    "Document Date", "Expiry Date", "Offsite Location", "On-Premises Location", 
+    "Remarks", "Keywords", "Document Type", "Document SubType Internal", 
+    "Lifespan", "Category"
+]
+
+_META_FIELDS = tuple(INDEXING_CSV_HEADERS[1:])
+_META_GETTER = itemgetter(*_META_FIELDS)
+_META_DEFAULTS = dict.fromkeys(_META_FIELDS, "")
+
+def _csv_row(restructured):
+    """Indexing CSV row for one v2 manifest entry, in INDEXING_CSV_HEADERS order."""
+    # Missing fields come from the defaults; one C-level itemgetter call pulls all 13
+    meta = {**_META_DEFAULTS, **(restructured["metadata"] or {})}
+    return (restructured["filename"], *_META_GETTER(meta))
+
+def json_dumpb(obj):
+    """Compact UTF-8 JSON bytes; orjson when installed, stdlib json otherwise."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+def json_loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def write_manifest_v2(path, header, entries_path):
+    """Wrap the streamed JSONL entries in the manifest_v2 JSON document indexing.py reads."""
+    with open(path, "wb") as out, open(entries_path, "rb") as entries:
+        out.write(b"{\n")
+        for key, value in header.items():
+            out.write(b"  " + json_dumpb(key) + b": " + json_dumpb(value) + b",\n")
+        out.write(b'  "files": [')
+        sep = b"\n    "
+        for line in entries:
+            out.write(sep + line.rstrip(b"\n"))
+            sep = b",\n    "
+        out.write(b"\n  ]\n}\n")
+    os.remove(entries_path)
+
+def write_dry_run_plan(entries, ctx, plan_path):
+    """Plan every entry to plan_path as JSONL; returns (count, first 10, last 10) old/new path pairs."""
+    count = 0
+    first, last = [], deque(maxlen=10)
+    with open(plan_path, "wb") as f:
+        for entry in entries:
+            plan = _plan_entry(entry, ctx)
+            if plan is None:
+                continue
+            count += 1
+            pair = (entry["path"], plan["new_relative_path"])
+            f.write(json_dumpb({"old_path": pair[0], "new_path": pair[1]}) + b"\n")
+            if len(first) < 10:
+                first.append(pair)
+            else:
+                last.append(pair)
+    return count, first, last
 
 def restructure_migration():
     """Restructure the migrated data into a cleaner business hierarchy."""
@@ -25,13 +502,26 @@ def restructure_migration():
     folders_to_skip = rules.get("folders_to_skip", [])
     skip_regex = rules.get("skip_regex", "")
     dry_run = rules.get("dry_run", True)
+    # Re-runs leave files alone whose copy is already finished (same size and not older,
+    # or stamped with the source's exact mtime by an earlier copy/unwrap)
+    skip_if_newer = rules.get("skip_if_newer", True)
+    # Print every file's old/new path instead of a progress line per 1000 files
+    verbose = rules.get("verbose", False)
+    # Copies only carry timestamps over unless the permission bits are wanted too
+    preserve_mode = rules.get("preserve_mode", False)
+    # copy | hardlink | reflink | auto (hardlink when source and target share a filesystem).
+    # Hardlinked files share an inode, so editing either copy edits both - fine for a
+    # read-only archive re-layout, not for a tree that will be worked on afterwards.
+    link_mode = rules.get("link_mode", "copy")
+    if link_mode not in LINK_MODES:
+        print(f"[Warning] Unknown link_mode {link_mode!r}, copying files instead")
+        link_mode = "copy"
     
     if not os.path.exists(source_manifest_path):
         print(f"[Error] Source manifest not found: {source_manifest_path}")
         return
         
-    with open(source_manifest_path, "r", encoding="utf-8") as f:
-        manifest = json.load(f)
+    manifest_header, manifest_files = load_manifest(source_manifest_path)
         
     print("=" * 70)
     print("VMR DATA RESTRUCTURING TOOL")
@@ -39,144 +529,94 @@ def restructure_migration():
         print("[MODE: DRY RUN - No files will be moved]")
     print("=" * 70)
     
-    restructured_files = []
+    cwd = os.getcwd()
+    source_root_abs = os.path.normpath(os.path.join(cwd, source_root))
+    ctx = {
+        "source_root_abs": source_root_abs,
+        "target_root": os.path.normpath(target_root),
+        "target_root_abs": os.path.normpath(os.path.join(cwd, target_root)),
+        "skip_set": frozenset(f.lower().strip() for f in folders_to_skip),
+        "skip_match": _skip_matcher(skip_regex),
+        "skip_if_newer": skip_if_newer,
+        "verbose": verbose,
+        "preserve_mode": preserve_mode,
+        "namer": UniqueNamer(),
+        "print_lock": threading.Lock(),
+    }
     
-    for entry in manifest.get("files", []):
-        filename = entry["filename"]
-        old_path = entry["path"]
-        metadata = entry["metadata"]
-        
-        # Determine relative path starting at the business root ("HR")
-        # Manifest path example:
-        #   vmr_downloads\HR\Live Employee\1997\11_Nov\E SAHILJADHAV(12345)\Internal Use\MAVROS (1).pdf
-        # Actual disk path example:
-        #   Group or Department\HR\Live Employee\1997\11_Nov\E SAHILJADHAV(12345)\Internal Use\MAVROS (1).pdf
-        # We therefore:
-        #   1) Trim everything before "HR"
-        #   2) Use that HR-onwards segment both for:
-        #        - locating the source file under source_root
-        #        - building the new relative structure under target_root
-        parts = old_path.split(os.sep)
-        try:
-            # Find the index of the first folder after the manifest's base directory
-            # In this case, we know the structure usually starts with HR
-            index = parts.index("HR")
-            clean_parts = parts[index:]
-        except ValueError:
-            print(f"  [Warning] Could not find 'HR' in path: {old_path}")
-            continue
-            
-        # Apply transformation rules
-        new_relative_parts = []
-        folders_to_skip_lower = [f.lower() for f in folders_to_skip]
-        
-        for part in clean_parts:
-            # Skip file name at the end
-            if part == filename:
-                continue
-                
-            # Check if part should be skipped (case-insensitive)
-            part_lower = part.lower().strip()
-            
-            is_skipped = False
-            if part_lower in folders_to_skip_lower:
-                is_skipped = True
-            elif skip_regex and re.match(skip_regex, part):
-                is_skipped = True
-                
-            if not is_skipped:
-                new_relative_parts.append(part)
-            
-        new_relative_path = os.path.join(target_root, *new_relative_parts, filename)
-        new_full_path = os.path.join(os.getcwd(), new_relative_path)
-        
-        print(f"\nProcessing: {filename}")
-        print(f"  Old: {old_path}")
-        print(f"  New: {new_relative_path}")
-        
-        if not dry_run:
-            # Ensure target directory exists
-            os.makedirs(os.path.dirname(new_full_path), exist_ok=True)
-            
-            # Copy file (using copy2 to preserve timestamps)
-            # We intentionally build the source path from:
-            #   CWD / source_root / HR\...\filename
-            # so that it matches the actual disk layout
-            source_full_path = os.path.join(os.getcwd(), source_root, *clean_parts)
-            if os.path.exists(source_full_path):
-                shutil.copy2(source_full_path, new_full_path)
-                print(f"  [Success] Copied successfully")
-            else:
-                print(f"  [Error] Source file missing: {source_full_path}")
-                continue
-        
-        restructured_files.append({
-            "filename": filename,
-            "old_path": old_path,
-            "new_path": new_relative_path,
-            "metadata": metadata
-        })
+    csv_path = os.path.join(target_root, "indexing_manifest.csv")
+    manifest_v2_path = os.path.join(target_root, "manifest_v2_restructured.json")
+    
+    if dry_run:
+        # Planning is all a dry run needs: no source walk, mkdirs, ZIP probes or per-file prints
+        plan_path = "dry_run_plan.jsonl"
+        count, first, last = write_dry_run_plan(manifest_files, ctx, plan_path)
+        print(f"\n[Dry Run] {count} files would be restructured (full plan: {plan_path})")
+        for old_path, new_path in first:
+            print(f"  {old_path}\n    -> {new_path}")
+        if last:
+            print("  ...")
+        for old_path, new_path in last:
+            print(f"  {old_path}\n    -> {new_path}")
+        print(f"\n[Dry Run] Would generate indexing manifest at: {csv_path}")
+        print(f"\n[Dry Run] Would save new manifest to: {manifest_v2_path}")
+        return
         
-    # Generate Indexing Manifest (CSV) for VMR Batch Import
-    headers = [
-        "File Name", "Classification", "Document Sub Type", "Quick Reference", 
-        "Document Date", "Expiry Date", "Offsite Location", "On-Premises Location", 
-        "Remarks", "Keywords", "Document Type", "Document SubType Internal", 
-        "Lifespan", "Category"
-    ]
+    # One walk of the source tree replaces a stat per manifest entry
+    ctx["src_index"] = build_source_index(source_root_abs)
     
-    csv_rows = []
-    for entry in restructured_files:
-        meta = entry["metadata"]
-        row = {
-            "File Name": entry["filename"],
-            "Classification": meta.get("Classification", ""),
-            "Document Sub Type": meta.get("Document Sub Type", ""),
-            "Quick Reference": meta.get("Quick Reference", ""),
-            "Document Date": meta.get("Document Date", ""),
-            "Expiry Date": meta.get("Expiry Date", ""),
-            "Offsite Location": meta.get("Offsite Location", ""),
-            "On-Premises Location": meta.get("On-Premises Location", ""),
-            "Remarks": meta.get("Remarks", ""),
-            "Keywords": meta.get("Keywords", ""),
-            "Document Type": meta.get("Document Type", ""),
-            "Document SubType Internal": meta.get("Document SubType Internal", ""),
-            "Lifespan": meta.get("Lifespan", ""),
-            "Category": meta.get("Category", "")
-        }
-        csv_rows.append(row)
+    # Work through the manifest a window at a time: plan it (cheap, no disk I/O),
+    # then copy it in parallel. The work is I/O bound, so threads overlap the
+    # syscalls fine despite the GIL. Each finished entry is streamed straight to
+    # the CSV and a JSONL scratch file instead of being kept in memory until the end.
+    entries_path = os.path.join(target_root, "manifest_v2_restructured.jsonl")
+    total_files = 0
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    os.makedirs(target_root, exist_ok=True)
+    if link_mode == "auto":
+        same_fs = os.stat(source_root_abs).st_dev == os.stat(ctx["target_root_abs"]).st_dev
+        link_mode = "hardlink" if same_fs else "copy"
+        print(f"  link_mode auto -> {link_mode}")
+    ctx["link_mode"] = link_mode
+    
+    with open(entries_path, "wb") as entries_file, \
+            open(csv_path, "w", encoding="utf-8", newline="") as csv_file, \
+            ThreadPoolExecutor(max_workers=max_workers) as ex:
+        writer = csv.writer(csv_file, quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(INDEXING_CSV_HEADERS)
         
-    csv_path = os.path.join(target_root, "indexing_manifest.csv")
-    if not dry_run:
-        os.makedirs(target_root, exist_ok=True)
-        with open(csv_path, "w", encoding="utf-8", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writeheader()
-            writer.writerows(csv_rows)
-        print(f"\n[Success] Indexing manifest generated: {csv_path}")
-    else:
-        print(f"\n[Dry Run] Would generate indexing manifest at: {csv_path}")
+        process = partial(_process_entry, ctx=ctx)
+        made_dirs = set()
+        done = 0
+        for window in _plan_windows(manifest_files, ctx):
+            # Create the window's target directories before its copies start so
+            # the workers never race each other on os.makedirs
+            _make_target_dirs({plan["target_dir_abs"] for plan in window}, made_dirs)
+            # ex.map hands results back in manifest order regardless of completion order
+            for restructured in ex.map(process, window):
+                done += 1
+                if not verbose and done % 1000 == 0:
+                    _log(ctx, f"  [{done}] files processed")
+                if restructured is None:
+                    continue
+                total_files += 1
+                entries_file.write(json_dumpb(restructured) + b"\n")
+                writer.writerow(_csv_row(restructured))
+        if not verbose:
+            _log(ctx, f"  [{done}] files processed")
+            
+    print(f"\n[Success] Indexing manifest generated: {csv_path}")
 
     # Generate new manifest (JSON)
     new_manifest_v2 = {
-        "timestamp": manifest.get("timestamp"),
-        "restructured_at": json.dumps(str(os.path.getmtime(config_path))), # just a placeholder for now
-        "total_files": len(restructured_files),
+        "timestamp": manifest_header.get("timestamp"),
+        "restructured_at": datetime.now().isoformat(),
+        "total_files": total_files,
         "structure_version": "2.0",
-        "files": restructured_files
     }
     
-    # Accurate timestamp
-    from datetime import datetime
-    new_manifest_v2["restructured_at"] = datetime.now().isoformat()
-    
-    manifest_v2_path = os.path.join(target_root, "manifest_v2_restructured.json")
-    if not dry_run:
-        with open(manifest_v2_path, "w", encoding="utf-8") as f:
-            json.dump(new_manifest_v2, f, indent=2, ensure_ascii=False)
-        print(f"\n[Success] Restructuring complete! New manifest saved to: {manifest_v2_path}")
-    else:
-        print(f"\n[Dry Run] Would save new manifest to: {manifest_v2_path}")
+    write_manifest_v2(manifest_v2_path, new_manifest_v2, entries_path)
+    print(f"\n[Success] Restructuring complete! New manifest saved to: {manifest_v2_path}")
 
 if __name__ == "__main__":
     restructure_migration()
\ No newline at end of file